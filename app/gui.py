@@ -1,16 +1,27 @@
 import sqlite3
 import tkinter as tk
 import tkinter.ttk as ttk
+import tkinter.filedialog as filedialog
+import tkinter.messagebox as messagebox
 import os
-import pandas as pd
+import sys
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from PIL import Image, ImageTk
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, ".."))
 DB_PATH = os.path.join(PROJECT_ROOT, "db", "elections.db")
 
+# A exportação do botão usa o mesmo código que a linha de comandos (etl/bulk_export.py)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "etl"))
+import bulk_export
+import search
+import raster
+
 CANVAS_W, CANVAS_H = 850, 850
 TOP_H = int(CANVAS_H * 0.6)
 BOTTOM_H = CANVAS_H - TOP_H
@@ -18,6 +29,13 @@ AZORES_W = CANVAS_W // 2
 MADEIRA_W = CANVAS_W // 2
 PADDING = 20
 
+# Linhas visíveis na lista de resultados da pesquisa
+SEARCH_ROWS = 8
+SEARCH_KIND_LABELS = {"district": "Distrito", "municipality": "Município", "party": "Partido"}
+
+# Intervalo (ms) entre verificações de uma nova versão da BD publicada pelo ETL
+DB_POLL_MS = 2000
+
 BG_COLOR = "white"
 OUTLINE_COLOR = "#222222"
 OUTLINE_WIDTH = 1
@@ -29,8 +47,24 @@ REGION_COLORS = {
 }
 
 MUNICIPALITY_FILL = "#8fbce6"   # azul claro
+PARISH_FILL = "#b3d4a0"         # verde claro
+SELECTED_FILL = "#f4a261"       # município escolhido
+NEIGHBOUR_FILL = "#f9d7b5"      # e os seus vizinhos
 MUNICIPALITY_ALPHA = 0.75
 
+# Partes com menos do que isto (px) no ecrã não são desenhadas (ilhéus, rochedos)
+MIN_PART_PX = 1.0
+# Nomes só em formas com pelo menos esta largura no ecrã
+LABEL_MIN_PX = 60
+LABEL_FONT = ("Arial", 8)
+LABEL_COLOR = "#222222"
+
+# Desenho do mapa: "vector" (um item do canvas por parte), "raster" (uma só imagem,
+# pintada fora da thread principal) ou "auto" (raster a partir de RASTER_MIN_PARTS partes)
+RENDER_MODES = {"Auto": "auto", "Vetorial": "vector", "Raster": "raster"}
+RASTER_MIN_PARTS = 500
+RASTER_POLL_MS = 20
+
 BAR_COLORS = [
     "#1b9e77", "#d95f02", "#7570b3", "#e7298a",
     "#66a61e", "#e6ab02", "#a6761d", "#666666"
@@ -46,6 +80,18 @@ def q(sql, args=()):
     return rows
 
 
+def db_signature():
+    # O ETL e o built_geometry.py trocam o ficheiro inteiro (os.replace): muda o inode/mtime
+    try:
+        st = os.stat(DB_PATH)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def db_version():
+    return q("PRAGMA user_version")[0][0]
+
+
 def parse_wkt_polygons(wkt):
     if not wkt:
         return []
@@ -106,18 +152,74 @@ def bounds(polys):
             ys.append(y)
     return min(xs), min(ys), max(xs), max(ys)
 
+def fit_scale(minx, miny, maxx, maxy, w, h):
+    return min((w - 2*PADDING)/(maxx-minx or 1),
+               (h - 2*PADDING)/(maxy-miny or 1))
+
 def projector(minx, miny, maxx, maxy, w, h):
-    scale = min((w - 2*PADDING)/(maxx-minx or 1),
-                (h - 2*PADDING)/(maxy-miny or 1))
+    scale = fit_scale(minx, miny, maxx, maxy, w, h)
     return lambda x, y: (
         PADDING + (x-minx)*scale,
         h - (PADDING + (y-miny)*scale)
     )
 
-
+def project_part(ring, proj, ox=0, oy=0):
+    # Coordenadas de ecrã de um anel, ou None se a parte ficar abaixo de MIN_PART_PX
+    pts = []
+    for x, y in ring:
+        X, Y = proj(x, y)
+        pts += [X + ox, Y + oy]
+    xs, ys = pts[0::2], pts[1::2]
+    if max(xs) - min(xs) < MIN_PART_PX and max(ys) - min(ys) < MIN_PART_PX:
+        return None
+    return pts
+
+def raster_job(shapes, w, h):
+    # Corre na thread de desenho: projeta e pinta todas as partes (ver raster.py)
+    parts = []
+    for i, (_, rings, proj, ox, oy, fill, _, _) in enumerate(shapes):
+        for ring in rings:
+            pts = project_part(ring, proj, ox, oy)
+            if pts is not None:
+                parts.append((i, fill, pts))
+    return raster.rasterize(parts, w, h, BG_COLOR, OUTLINE_COLOR)
+
+def meta_extent(meta, codes):
+    # União das caixas em SHAPE_META; None se faltar alguma forma (BD sem metadados)
+    boxes = [meta.get(c) for c in codes]
+    if not boxes or None in boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+@functools.lru_cache(maxsize=None)
+def fetch_shape_meta(level):
+    # {código: (minx, miny, maxx, maxy, label_x, label_y, área, partes, vértices)}
+    # calculado pelo built_geometry.py; vazio numa BD anterior a SHAPE_META
+    try:
+        rows = q("""
+            SELECT CODE, MINX, MINY, MAXX, MAXY, LABEL_X, LABEL_Y, AREA, PARTS, VERTICES
+            FROM SHAPE_META
+            WHERE LEVEL = ?
+        """, (level,))
+    except sqlite3.OperationalError:
+        return {}
+    return {r[0]: r[1:] for r in rows}
+
+@functools.lru_cache(maxsize=None)
+def fetch_region_extents():
+    try:
+        rows = q("SELECT REGION, MINX, MINY, MAXX, MAXY FROM REGION_EXTENT")
+    except sqlite3.OperationalError:
+        return {}
+    return {r[0]: r[1:] for r in rows}
+
+@functools.lru_cache(maxsize=None)
 def fetch_districts():
+    # Em cache: a vista nacional é redesenhada a cada "Back" (limpa em App.reload_data)
     rows = q("""
-        SELECT d.CODE, d.NAME, d.REGION, s.GEOM_WKT
+        SELECT d.CODE, d.NAME, d.REGION, s.DISTRICT_CODE, s.GEOM_WKT
         FROM DISTRICTS d
         JOIN DISTRICT_SHAPE s
           ON (
@@ -128,9 +230,10 @@ def fetch_districts():
         ORDER BY d.CODE
     """)
     out = {}
-    for c, n, r, g in rows:
-        out.setdefault(c, {"name": n, "region": r, "polys": []})
+    for c, n, r, sc, g in rows:
+        out.setdefault(c, {"name": n, "region": r, "polys": [], "shapes": []})
         out[c]["polys"] += parse_wkt_polygons(g)
+        out[c]["shapes"].append(sc)
     return out
 
 def fetch_municipalities(dist):
@@ -151,7 +254,38 @@ def fetch_municipalities(dist):
 
     return [(c, n, parse_wkt_polygons(g)) for c, n, g in rows]
 
-def votes_by_district(dist):
+def fetch_parishes(mun):
+    # Só as freguesias do município pedido (índice em PARISHES.MUNICIPALITY_CODE);
+    # as vistas nacional e distrital nunca tocam nestas tabelas
+    rows = q("""
+        SELECT p.CODE, p.NAME, s.GEOM_WKT
+        FROM PARISHES p
+        JOIN PARISH_SHAPE s ON s.PARISH_CODE = p.CODE
+        WHERE p.MUNICIPALITY_CODE = ?
+        ORDER BY p.NAME
+    """, (mun,))
+
+    return [(c, n, parse_wkt_polygons(g)) for c, n, g in rows]
+
+def fetch_neighbours(mun):
+    # Vizinhos pela chave primária de MUNICIPALITY_ADJACENCY (built_geometry.py);
+    # vazio numa BD anterior à tabela
+    try:
+        return q("""
+            SELECT a.NEIGHBOUR_CODE, m.NAME, d.CODE, d.NAME, a.BORDER_LENGTH
+            FROM MUNICIPALITY_ADJACENCY a
+            JOIN MUNICIPALITIES m ON m.CODE = a.NEIGHBOUR_CODE
+            JOIN DISTRICTS d ON d.CODE = m.DISTRICT_CODE
+            WHERE a.MUNICIPALITY_CODE = ?
+            ORDER BY a.BORDER_LENGTH DESC
+        """, (mun,))
+    except sqlite3.OperationalError:
+        return []
+
+def fetch_elections():
+    return [y for (y,) in q("SELECT YEAR FROM ELECTIONS ORDER BY YEAR")]
+
+def votes_by_district(dist, year):
     if dist == 30:
         where, args = "m.DISTRICT_CODE BETWEEN 30 AND 39", ()
     elif dist == 40:
@@ -163,27 +297,64 @@ def votes_by_district(dist):
         SELECT v.DETAILED_NAME, SUM(v.VOTES)
         FROM VOTINGS v
         JOIN MUNICIPALITIES m ON m.CODE = v.MUNICIPALITY_CODE
-        WHERE {where}
+        WHERE v.ELECTION_YEAR = ? AND {where}
         GROUP BY v.DETAILED_NAME
         HAVING SUM(v.VOTES) > 0
         ORDER BY SUM(v.VOTES) DESC
-    """, args)
+    """, (year,) + args)
 
-def votes_by_municipality(code):
+def votes_by_municipality(code, year):
     return q("""
         SELECT DETAILED_NAME, SUM(VOTES), SUM(MANDATES)
         FROM VOTINGS
-        WHERE MUNICIPALITY_CODE = ?
+        WHERE ELECTION_YEAR = ? AND MUNICIPALITY_CODE = ?
+        GROUP BY DETAILED_NAME
+        HAVING SUM(VOTES) > 0
+        ORDER BY SUM(VOTES) DESC
+    """, (year, code))
+
+def votes_by_parish(code, year):
+    return q("""
+        SELECT DETAILED_NAME, SUM(VOTES), SUM(MANDATES)
+        FROM PARISH_VOTINGS
+        WHERE ELECTION_YEAR = ? AND PARISH_CODE = ?
         GROUP BY DETAILED_NAME
         HAVING SUM(VOTES) > 0
         ORDER BY SUM(VOTES) DESC
-    """, (code,))
+    """, (year, code))
+
+def load_search_index():
+    # Lido uma vez (e de novo quando a BD muda); as pesquisas por tecla não tocam na BD
+    items = [("district", n, (c, n)) for c, n in q("SELECT CODE, NAME FROM DISTRICTS")]
+    items += [("municipality", n, (c, n, d, dn)) for c, n, d, dn in q("""
+        SELECT m.CODE, m.NAME, d.CODE, d.NAME
+        FROM MUNICIPALITIES m
+        JOIN DISTRICTS d ON d.CODE = m.DISTRICT_CODE
+    """)]
+    items += [("party", n, n) for (n,) in q("SELECT DISTINCT DETAILED_NAME FROM VOTINGS WHERE DETAILED_NAME IS NOT NULL")]
+    return search.build_index(items)
+
+def best_municipality(detailed_name, year):
+    # Município com a maior percentagem de votos da lista (de preferência na eleição escolhida)
+    rows = q("""
+        SELECT m.CODE, m.NAME, d.CODE, d.NAME
+        FROM VOTINGS v
+        JOIN MUNICIPALITIES m ON m.CODE = v.MUNICIPALITY_CODE
+        JOIN DISTRICTS d ON d.CODE = m.DISTRICT_CODE
+        WHERE v.DETAILED_NAME = ?
+        ORDER BY v.ELECTION_YEAR = ? DESC, 1.0 * v.VOTES / NULLIF(v.TOTAL_VOTERS, 0) DESC
+        LIMIT 1
+    """, (detailed_name, year))
+    return rows[0] if rows else None
 
 
 class App:
     def __init__(self):
         self.level = "districts"
         self.current_fig = None
+        self.current_district = None
+        self.current_municipality = None
+        self.current_parish = None
         
         self.root = tk.Tk()
         self.root.title("Portugal — Resultados Eleitorais")
@@ -201,9 +372,38 @@ class App:
 
         self.title_lbl = tk.Label(header, font=("Arial", 16, "bold"), bg="#f0f0f0")
         self.title_lbl.pack(side="left", expand=True)
-        self.export_button = tk.Button(header, text = " CSV ", command=self.on_export_csv, font=("Arial", 10), state="disabled")
+        self.export_button = tk.Button(header, text = " Exportar ", command=self.on_export, font=("Arial", 10))
         self.export_button.pack(side="right", padx=10, pady=10)
 
+        # Eleição apresentada (por omissão a mais recente carregada)
+        self.elections = fetch_elections()
+        self.year = tk.IntVar(value=self.elections[-1] if self.elections else 0)
+        self.year_menu = tk.OptionMenu(header, self.year, *(self.elections or [0]),
+                                       command=lambda _: self.on_election_change())
+        self.year_menu.pack(side="right", padx=10, pady=10)
+
+        # Pesquisa instantânea (índice em memória, ver search.py)
+        self.search_index = load_search_index()
+        self.search_matches = []
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", lambda *_: self.on_search_change())
+        self.search_entry = tk.Entry(header, textvariable=self.search_var, width=28, font=("Arial", 10))
+        self.search_entry.pack(side="right", padx=10, pady=10)
+        self.search_entry.bind("<Return>", lambda e: self.on_search_choose(0))
+        self.search_entry.bind("<Down>", lambda e: self.focus_search_list())
+        self.search_entry.bind("<Escape>", lambda e: self.search_var.set(""))
+        tk.Label(header, text="Pesquisar:", font=("Arial", 10), bg="#f0f0f0").pack(side="right")
+
+        self.render_mode = tk.StringVar(value="Auto")
+        tk.OptionMenu(header, self.render_mode, *RENDER_MODES,
+                      command=lambda _: self.refresh_view()).pack(side="right", padx=10, pady=10)
+
+        # Lista de sugestões por cima do mapa, logo abaixo da caixa de pesquisa
+        self.search_list = tk.Listbox(self.root, height=SEARCH_ROWS, font=("Arial", 10), activestyle="dotbox")
+        self.search_list.bind("<Return>", lambda e: self.on_search_choose(self.search_list.index("active")))
+        self.search_list.bind("<ButtonRelease-1>", lambda e: self.on_search_choose(self.search_list.nearest(e.y)))
+        self.search_list.bind("<Escape>", lambda e: (self.search_var.set(""), self.search_entry.focus_set()))
+
         # Content Area
         self.main_container = tk.Frame(self.root)
         self.main_container.pack(fill="both", expand=True)
@@ -216,20 +416,42 @@ class App:
         self.canvas = tk.Canvas(self.map_frame, bg="white", highlightthickness=0)
         self.canvas.pack(fill="both", expand=True)
 
+        # Modo raster: os eventos do canvas são resolvidos pelo raster de identificação
+        self.raster = None
+        self.map_marks = {}
+        self.shape_fills = {}
+        self.render_seq = 0
+        self.render_pool = ThreadPoolExecutor(max_workers=1)
+        self.canvas.bind("<Motion>", self.on_raster_motion)
+        self.canvas.bind("<Leave>", lambda e: self.set_raster_hover(-1))
+        self.canvas.bind("<Button-1>", self.on_raster_click)
+
+        # Setas: saltar para o município vizinho nessa direção
+        for key, dx, dy in (("<Left>", -1, 0), ("<Right>", 1, 0), ("<Up>", 0, 1), ("<Down>", 0, -1)):
+            self.root.bind(key, lambda e, dx=dx, dy=dy: self.on_arrow(e, dx, dy))
+
         # Resultados (Direita) - Largura fixa para não "empurrar" o mapa
         self.results_frame = tk.Frame(self.main_container, width=500)
         self.results_frame.pack(side="right", fill="both", padx=10, pady=5)
         self.results_frame.pack_propagate(False) # Mantém a largura fixa
 
+        # Versão da BD carregada: quando o ETL publica outra, a GUI recarrega sozinha
+        self.db_sig = db_signature()
+        self.db_version = db_version()
+
         self.root.update()
         self.draw_districts()
+        self.root.after(DB_POLL_MS, self.watch_db)
         self.root.mainloop()
 
     def draw_districts(self):
         self.level = "districts"
+        self.current_district = None
+        self.current_municipality = None
+        self.current_parish = None
         self.back_btn.config(state="disabled") #neste nivel nao se usa BACK button
         self.title_lbl.config(text="Portugal — Mapa Geral") 
-        self.canvas.delete("all")
+        self.clear_map()
         self.clear_results()
 
      
@@ -245,6 +467,8 @@ class App:
         half_w = curr_w // 2              # Divisão entre Açores e Madeira
 
         data = fetch_districts()
+        meta = fetch_shape_meta("district")
+        extents = fetch_region_extents()
 
         # 3. Ajustar as coordenadas de origem (ox, oy) e dimensões (w, h)
         regions_config = [
@@ -253,73 +477,267 @@ class App:
             ("M", half_w, top_h, half_w, bottom_h), # Madeira ( inferior direito)
         ]
 
+        shapes, labels = [], []
         for region, ox, oy, w, h in regions_config:
             items = [(c, d) for c, d in data.items() if d["region"] == region]
             if not items:
                 continue
 
-            all_polys = [p for _, d in items for p in d["polys"]]
-            proj = projector(*bounds(all_polys), w, h)
+            # Enquadramento lido de REGION_EXTENT; sem metadados, percorre os vértices
+            extent = extents.get(region) or bounds([p for _, d in items for p in d["polys"]])
+            proj = projector(*extent, w, h)
 
             for code, info in items:
-                for poly in info["polys"]:
-                    pts = []
-                    for x, y in poly[0]:
-                        X, Y = proj(x, y)
-                        pts += [X + ox, Y + oy]
-
-                    pid = self.canvas.create_polygon(
-                        *pts,
-                        fill=REGION_COLORS[region],
-                        outline=OUTLINE_COLOR,
-                        activefill="#5da5da" # muda cor ao passar o rato "hover"
-                    )
+                shapes.append((
+                    code, [poly[0] for poly in info["polys"]], proj, ox, oy,
+                    REGION_COLORS[region],
+                    "#5da5da", # muda cor ao passar o rato "hover"
                     #zoom by click
-                    self.canvas.tag_bind(
-                        pid, "<Button-1>",
-                        lambda e, c=code, n=info["name"]:
-                            self.show_district(c, n)
-                    )
+                    lambda c=code, n=info["name"]: self.show_district(c, n),
+                ))
+
+            # Nome de cada distrito na maior das suas formas (Açores/Madeira têm várias)
+            scale = fit_scale(*extent, w, h)
+            for code, info in items:
+                metas = [meta[sc] for sc in info["shapes"] if sc in meta]
+                if metas:
+                    labels.append((info["name"], max(metas, key=lambda m: m[6]), proj, scale, ox, oy))
+
+        self.paint(shapes, curr_w, curr_h)
+        for label in labels:
+            self.draw_label(*label)
 
     def show_district(self, code, name):
         self.level = "municipalities"
+        self.current_district = (code, name)
+        self.current_municipality = None
+        self.current_parish = None
         self.back_btn.config(state="normal")#para nao entrar antes na funcao on_back mesmo ao clical no mapa
         self.title_lbl.config(text=f"Distrito:{name}")
 
-        self.update_results(f"{name}", votes_by_district(code))
+        self.update_results(f"{name}", votes_by_district(code, self.year.get()))
         self.draw_municipalities(code)
 
     def draw_municipalities(self, dist):
-        self.canvas.delete("all")
-        data = fetch_municipalities(dist)
-# Pega todos os polígonos do distrito selecionado para calcular o zoom ideal
+        self.draw_shapes(fetch_municipalities(dist), MUNICIPALITY_FILL, "#6699cc",
+                         self.show_municipality, fetch_shape_meta("municipality"))
+
+    def draw_label(self, name, m, proj, scale, ox=0, oy=0):
+        # m: linha de SHAPE_META; o nome só cabe em formas largas o suficiente
+        if (m[2] - m[0]) * scale < LABEL_MIN_PX:
+            return
+        X, Y = proj(m[4], m[5])
+        # "disabled": o texto não apanha os cliques destinados ao polígono por baixo
+        self.canvas.create_text(X + ox, Y + oy, text=name, font=LABEL_FONT,
+                                fill=LABEL_COLOR, state="disabled")
+
+    def draw_shapes(self, data, fill, activefill, on_click, meta=None):
+        # Desenha uma lista (código, nome, polígonos) ajustada ao canvas inteiro
+        self.clear_map()
+        meta = meta or {}
+# Pega todos os polígonos da seleção para calcular o zoom ideal
         all_ps = [p for _, _, ps in data for p in ps]
         if not all_ps: return
 
         w = self.canvas.winfo_width() or CANVAS_W
         h = self.canvas.winfo_height() or CANVAS_H
-        
-        proj = projector(*bounds(all_ps), w, h)
+
+        # Com SHAPE_META o enquadramento não precisa de percorrer os vértices
+        extent = meta_extent(meta, [code for code, _, _ in data]) or bounds(all_ps)
+        proj = projector(*extent, w, h)
+        scale = fit_scale(*extent, w, h)
+        shapes = []
         for code, name, polys in data:
-            for poly in polys:
-                pts = []
-                for x, y in poly[0]:
-                    X, Y = proj(x, y)
-                    pts += [X, Y]
+            m = meta.get(code)
+            # Forma inteira abaixo de um píxel: nem chega a projetar as coordenadas
+            if m and (m[2] - m[0]) * scale < MIN_PART_PX and (m[3] - m[1]) * scale < MIN_PART_PX:
+                continue
+            shapes.append((code, [poly[0] for poly in polys], proj, 0, 0, fill, activefill,
+                           lambda c=code, n=name: on_click(c, n)))
+
+        self.paint(shapes, w, h)
+        for code, name, _ in data:
+            if code in meta:
+                self.draw_label(name, meta[code], proj, scale)
+
+    def clear_map(self):
+        # Limpa o canvas e descarta qualquer raster ainda a ser pintado para a vista anterior
+        self.canvas.delete("all")
+        self.raster = None
+        self.map_marks = {}
+        self.shape_fills = {}
+        self.render_seq += 1
+        self.canvas.config(cursor="")
+
+    def paint(self, shapes, w, h):
+        # shapes: (código, anéis, projeção, ox, oy, cor, cor de hover, ação do clique) por forma
+        mode = RENDER_MODES[self.render_mode.get()]
+        n_parts = sum(len(rings) for _, rings, *_ in shapes)
+        self.shape_fills = {code: fill for code, _, _, _, _, fill, *_ in shapes}
+        if mode == "raster" or (mode == "auto" and n_parts >= RASTER_MIN_PARTS):
+            future = self.render_pool.submit(raster_job, shapes, w, h)
+            self.root.after(RASTER_POLL_MS, self.poll_raster, future, self.render_seq, shapes)
+            return
+        self.paint_vector(shapes)
+
+    def paint_vector(self, shapes):
+        for code, rings, proj, ox, oy, fill, activefill, on_click in shapes:
+            for ring in rings:
+                pts = project_part(ring, proj, ox, oy)
+                if pts is None:
+                    continue
 
                 pid = self.canvas.create_polygon(
                     *pts,
-                    fill=MUNICIPALITY_FILL,
+                    fill=fill,
                     outline=OUTLINE_COLOR,
-                    width=1,
-                    activefill="#6699cc"
-                )
-                self.canvas.tag_bind(
-                    pid, "<Button-1>",
-                    lambda e, c=code, n=name:
-                        self.update_results(f"{n}",
-                                          votes_by_municipality(c))
+                    width=OUTLINE_WIDTH,
+                    activefill=activefill,
+                    tags=("shape", f"shape{code}")
                 )
+                self.canvas.tag_bind(pid, "<Button-1>", lambda e, cb=on_click: cb())
+
+    def poll_raster(self, future, seq, shapes):
+        if seq != self.render_seq:
+            return  # a vista mudou entretanto
+        if not future.done():
+            self.root.after(RASTER_POLL_MS, self.poll_raster, future, seq, shapes)
+            return
+
+        try:
+            base, id_map, edges = future.result()
+        except Exception as e:
+            # Se o raster falhar, a vista é desenhada em vetorial em vez de ficar em branco
+            print(f"Erro no modo raster ({e}); a desenhar em vetorial.")
+            self.paint_vector(shapes)
+            self.canvas.tag_lower("shape")  # os nomes já desenhados ficam por cima
+            if self.map_marks:
+                self.apply_marks()
+            return
+        photo = ImageTk.PhotoImage(Image.fromarray(base))
+        item = self.canvas.create_image(0, 0, anchor="nw", image=photo)
+        self.canvas.tag_lower(item)  # os nomes ficam por cima
+        self.raster = {"clean": base, "base": base, "ids": id_map, "edges": edges, "shapes": shapes,
+                       "item": item, "photo": photo, "hover": -1}
+        if self.map_marks:
+            self.apply_marks()
+
+    def mark_shapes(self, marks):
+        # {código: cor} por cima das cores normais até a vista mudar (clear_map)
+        if self.raster is None:
+            # No vetorial, as formas que deixam de estar marcadas voltam à cor normal
+            # (as marcas podem incluir vizinhos de outro distrito, que não estão desenhados)
+            for code in self.map_marks.keys() - marks.keys():
+                fill = self.shape_fills.get(code)
+                if fill is not None:
+                    self.canvas.itemconfig(f"shape{code}", fill=fill)
+        self.map_marks = marks
+        self.apply_marks()
+
+    def apply_marks(self):
+        r = self.raster
+        if r is None:
+            # Vetorial (ou raster ainda a pintar: poll_raster volta a chamar)
+            for code, colour in self.map_marks.items():
+                self.canvas.itemconfig(f"shape{code}", fill=colour)
+            return
+        colours = {i: self.map_marks[s[0]] for i, s in enumerate(r["shapes"]) if s[0] in self.map_marks}
+        r["base"] = raster.recolour(r["clean"], r["ids"], r["edges"], colours)
+        r["hover"] = -1
+        r["photo"] = ImageTk.PhotoImage(Image.fromarray(r["base"]))
+        self.canvas.itemconfig(r["item"], image=r["photo"])
+
+    def set_raster_hover(self, i):
+        r = self.raster
+        if r is None or i == r["hover"]:
+            return
+        r["hover"] = i
+        if i < 0:
+            r["photo"] = ImageTk.PhotoImage(Image.fromarray(r["base"]))
+        else:
+            r["photo"] = ImageTk.PhotoImage(raster.highlight(r["base"], r["ids"], r["edges"], i, r["shapes"][i][6]))
+        self.canvas.itemconfig(r["item"], image=r["photo"])
+        self.canvas.config(cursor="hand2" if i >= 0 else "")
+
+    def on_raster_motion(self, event):
+        if self.raster is not None:
+            self.set_raster_hover(raster.shape_at(self.raster["ids"], event.x, event.y))
+
+    def on_raster_click(self, event):
+        self.canvas.focus_set()  # para as setas chegarem a on_arrow
+        if self.raster is None:
+            return
+        i = raster.shape_at(self.raster["ids"], event.x, event.y)
+        if i >= 0:
+            self.raster["shapes"][i][7]()
+
+    def show_neighbours(self, code):
+        # Lista dos vizinhos no topo do painel e, se o mapa mostra os municípios do distrito,
+        # destaque do escolhido e dos vizinhos
+        neighbours = fetch_neighbours(code)
+        if not neighbours:
+            return
+        names = ", ".join(n for _, n, _, _, _ in neighbours)
+        panel = self.results_frame.winfo_children()
+        tk.Label(self.results_frame, text=f"Vizinhos (setas para navegar): {names}",
+                 font=("Arial", 9), wraplength=460, justify="left", anchor="w"
+                 ).pack(fill="x", padx=10, pady=(5, 0), before=panel[0] if panel else None)
+        if self.level == "municipalities":
+            marks = {c: NEIGHBOUR_FILL for c, _, _, _, _ in neighbours}
+            marks[code] = SELECTED_FILL
+            self.mark_shapes(marks)
+
+    def on_arrow(self, event, dx, dy):
+        # Salta para o vizinho cuja direção (entre pontos de nome em SHAPE_META) fica mais
+        # perto da seta, até 60º de desvio
+        if self.current_municipality is None or event.widget not in (self.root, self.canvas):
+            return
+        code = self.current_municipality[0]
+        meta = fetch_shape_meta("municipality")
+        if code not in meta:
+            return
+
+        x0, y0 = meta[code][4:6]
+        best, best_cos = None, 0.5
+        for n in fetch_neighbours(code):
+            if n[0] not in meta:
+                continue
+            vx, vy = meta[n[0]][4] - x0, meta[n[0]][5] - y0
+            cos = (vx * dx + vy * dy) / ((vx * vx + vy * vy) ** 0.5 or 1)
+            if cos > best_cos:
+                best, best_cos = n, cos
+        if best is None:
+            return
+
+        n_code, n_name, dist, dist_name, _ = best
+        # Só redesenha o mapa se o vizinho for de outro distrito (ou se estava nas freguesias)
+        if self.level != "municipalities" or dist != self.current_district[0]:
+            self.show_district(dist, dist_name)
+        self.show_municipality(n_code, n_name)
+
+    def show_municipality(self, code, name):
+        # 1º clique: escolhe o município no mapa do distrito (resultados e vizinhos);
+        # 2º clique no mesmo município: abre as suas freguesias
+        if self.level == "municipalities" and self.current_municipality == (code, name):
+            self.show_parishes(code, name)
+            return
+        self.current_municipality = (code, name)
+        self.current_parish = None
+        self.update_results(f"{name}", votes_by_municipality(code, self.year.get()))
+        self.show_neighbours(code)
+
+    def show_parishes(self, code, name):
+        # 3º nível: as freguesias são lidas da BD só agora, para este município
+        parishes = fetch_parishes(code)
+        if parishes:
+            self.level = "parishes"
+            self.title_lbl.config(text=f"Município:{name}")
+            self.draw_shapes(parishes, PARISH_FILL, "#88bb77", self.show_parish,
+                             fetch_shape_meta("parish"))
+
+    def show_parish(self, code, name):
+        self.current_parish = (code, name)
+        self.update_results(f"{name}", votes_by_parish(code, self.year.get()))
 
 
     def clear_results(self):
@@ -339,7 +757,6 @@ class App:
             plt.close(self.current_fig) # Explicitly close the figure, cnava em si 
         self.current_rows = rows
         self.current_title = title 
-        self.export_button.config(state="normal")  # Ativar botão export
         if not rows:
             tk.Label(self.results_frame, text="Sem dados para esta seleção").pack()
             return
@@ -381,35 +798,157 @@ class App:
         canvas.draw()
         canvas.get_tk_widget().pack(fill="both", expand=True)
 
+    def watch_db(self):
+        # q() abre uma ligação nova por consulta, por isso depois da troca as consultas
+        # já leem a BD nova; falta só limpar as caches e redesenhar a vista atual
+        sig = db_signature()
+        if sig is not None and sig != self.db_sig:
+            self.db_sig = sig
+            version = db_version()
+            if version != self.db_version:
+                print(f"Nova versão da BD: v{self.db_version} -> v{version}")
+                self.db_version = version
+                self.reload_data()
+        self.root.after(DB_POLL_MS, self.watch_db)
+
+    def reload_data(self):
+        fetch_districts.cache_clear()
+        fetch_shape_meta.cache_clear()
+        fetch_region_extents.cache_clear()
+        self.search_index = load_search_index()
+
+        # Eleições disponíveis podem ter mudado
+        self.elections = fetch_elections()
+        menu = self.year_menu["menu"]
+        menu.delete(0, "end")
+        for y in self.elections:
+            menu.add_command(label=y, command=lambda v=y: (self.year.set(v), self.on_election_change()))
+        if self.elections and self.year.get() not in self.elections:
+            self.year.set(self.elections[-1])
+
+        self.refresh_view()
+
+    def refresh_view(self):
+        # Redesenha o nível atual (mapa e resultados) a partir da BD
+        district, municipality, parish = self.current_district, self.current_municipality, self.current_parish
+        level = self.level
+        if district is None:
+            self.draw_districts()
+            return
+        self.show_district(*district)
+        if municipality:
+            self.show_municipality(*municipality)
+            if level == "parishes":
+                self.show_parishes(*municipality)
+        if parish and self.level == "parishes":
+            self.show_parish(*parish)
+
     def on_back(self):
-        if self.level == "municipalities":
+        if self.level == "parishes":
+            self.show_district(*self.current_district)
+        elif self.level == "municipalities":
             self.draw_districts()
 
-    def on_export_csv(self):
-        if not hasattr(self, 'current_rows') or not self.current_rows:
+    def on_election_change(self):
+        # O mapa não muda entre eleições: só os resultados apresentados
+        year = self.year.get()
+        if self.current_parish:
+            code, name = self.current_parish
+            self.update_results(name, votes_by_parish(code, year))
+        elif self.current_municipality:
+            code, name = self.current_municipality
+            self.update_results(name, votes_by_municipality(code, year))
+            self.show_neighbours(code)
+        elif self.current_district:
+            code, name = self.current_district
+            self.update_results(name, votes_by_district(code, year))
+
+    def on_search_change(self):
+        self.search_matches = search.search(self.search_index, self.search_var.get())
+        self.search_list.delete(0, "end")
+        if not self.search_matches:
+            self.search_list.place_forget()
             return
-        
-        import pandas as pd
-        
-        # Detecta número de colunas dinamicamente
-        num_cols = len(self.current_rows[0]) if self.current_rows else 0
-        
-        if num_cols == 2:
-            df = pd.DataFrame(self.current_rows, columns=["Partido", "Votos"])
-        elif num_cols == 3:
-            df = pd.DataFrame(self.current_rows, columns=["Partido", "Votos", "Mandatos"])
-        else:
-            print("Formato de dados inválido")
+        for kind, label, _, _ in self.search_matches:
+            self.search_list.insert("end", f"{label}  ({SEARCH_KIND_LABELS[kind]})")
+        self.search_list.config(height=min(len(self.search_matches), SEARCH_ROWS))
+        self.search_list.place(in_=self.search_entry, relx=1, rely=1, anchor="ne", width=320, y=2)
+        self.search_list.lift()
+
+    def focus_search_list(self):
+        if self.search_matches:
+            self.search_list.focus_set()
+            self.search_list.activate(0)
+            self.search_list.selection_set(0)
+
+    def on_search_choose(self, i):
+        if not 0 <= i < len(self.search_matches):
             return
-        
-        if self.level == "municipalities":
-            filename = f"resultados_{self.current_title}.csv"
+        kind, label, key, _ = self.search_matches[i]
+        self.search_var.set("")
+        self.root.focus_set()
+
+        if kind == "district":
+            self.show_district(*key)
+        elif kind == "municipality":
+            code, name, dist, dist_name = key
+            self.show_district(dist, dist_name)
+            self.show_municipality(code, name)
         else:
-            filename = f"resultados_portugal.csv"
-        
-        df.to_csv(filename, index=False, encoding='utf-8')
-        print(f"Exportado: {filename}")
+            # Um partido/lista leva ao município onde teve melhor resultado
+            found = best_municipality(key, self.year.get())
+            if found is None:
+                return
+            code, name, dist, dist_name = found
+            self.show_district(dist, dist_name)
+            self.show_municipality(code, name)
+            if not self.current_rows:
+                return
+            for item in self.tree.get_children():
+                if self.tree.item(item, "values")[0] == key:
+                    self.tree.selection_set(item)
+                    self.tree.see(item)
+
+    def export_selection(self):
+        # (nível, filtros, nome) da vista atual para bulk_export.export_level
+        year = self.year.get()
+        if self.level == "parishes":
+            if self.current_parish:
+                code, name = self.current_parish
+                return "parishes", {"year": year, "parish": code}, name
+            code, name = self.current_municipality
+            return "parishes", {"year": year, "municipality": code}, name
+        if self.level == "municipalities":
+            if self.current_municipality:
+                code, name = self.current_municipality
+                return "municipalities", {"year": year, "municipality": code}, name
+            code, name = self.current_district
+            return "municipalities", {"year": year, "district": code}, name
+        return "districts", {"year": year}, "portugal"
+
+    def on_export(self):
+        level, filters, name = self.export_selection()
+        path = filedialog.asksaveasfilename(
+            parent=self.root, initialfile=f"resultados_{name}_{filters['year']}.csv",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("Parquet", "*.parquet"), ("Arrow", "*.arrow")])
+        if not path:
+            return
+
+        ext = os.path.splitext(path)[1].lower()
+        fmt = next((f for f, e in bulk_export.FORMATS.items() if e == ext), "csv")
+        try:
+            rows, size, secs = bulk_export.export_level(level, fmt, path, db_file=DB_PATH, **filters)
+        except RuntimeError as e:
+            messagebox.showerror("Exportação", str(e), parent=self.root)
+            return
+        print(f"Exportado: {path} ({rows} linhas, {size / 1e6:.2f} MB, {secs:.2f}s)")
 
 
 if __name__ == "__main__":
+    if not os.path.exists(DB_PATH):
+        raise SystemExit("elections.db not found. Run etl.py first.")
+    # BD anterior à dimensão de eleição: etl.py migra-a para o esquema atual
+    if not q("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ELECTIONS'"):
+        raise SystemExit("BD no formato antigo (sem ELECTIONS). Run etl.py first.")
     App()
\ No newline at end of file
@@ -0,0 +1,52 @@
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+
+# Modo raster do mapa: em vez de um item create_polygon (com o seu tag_bind) por parte,
+# a vista inteira é pintada numa só imagem, mostrada como um único item do canvas.
+# Em paralelo pinta-se um raster de identificação, onde cada forma tem uma cor única
+# (índice + 1 em RGB; 0 = fundo): cliques e hover são uma leitura de um píxel.
+
+
+def id_colour(i):
+    n = i + 1
+    return ((n >> 16) & 255, (n >> 8) & 255, n & 255)
+
+
+def rasterize(parts, w, h, bg, outline):
+    # parts: (índice da forma, cor de preenchimento, pontos de ecrã [x0, y0, x1, y1, ...]).
+    # Devolve (imagem RGB como array, mapa de índices (h, w) com -1 no fundo,
+    # máscara dos contornos). Não toca no Tk: pode correr fora da thread principal.
+    img = Image.new("RGB", (w, h), bg)
+    ids = Image.new("RGB", (w, h), (0, 0, 0))
+    edges = Image.new("L", (w, h), 0)
+    draw_img, draw_ids, draw_edges = ImageDraw.Draw(img), ImageDraw.Draw(ids), ImageDraw.Draw(edges)
+
+    for i, fill, pts in parts:
+        draw_img.polygon(pts, fill=fill, outline=outline)
+        draw_ids.polygon(pts, fill=id_colour(i))
+        draw_edges.polygon(pts, outline=255)
+
+    rgb = np.asarray(ids, dtype=np.int32)
+    id_map = ((rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]) - 1
+    return np.asarray(img), id_map, np.asarray(edges) > 0
+
+
+def shape_at(id_map, x, y):
+    # Índice da forma no píxel (x, y), ou -1 (fundo ou fora da imagem)
+    h, w = id_map.shape
+    if 0 <= x < w and 0 <= y < h:
+        return int(id_map[y, x])
+    return -1
+
+
+def recolour(base, id_map, edges, colours):
+    # Cópia da imagem com as formas {índice: cor} repintadas (os contornos mantêm-se)
+    out = base.copy()
+    for i, colour in colours.items():
+        out[(id_map == i) & ~edges] = ImageColor.getrgb(colour)
+    return out
+
+
+def highlight(base, id_map, edges, i, colour):
+    # Imagem com a forma i na cor de hover
+    return Image.fromarray(recolour(base, id_map, edges, {i: colour}))
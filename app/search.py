@@ -0,0 +1,104 @@
+import unicodedata
+
+# Índice de pesquisa em memória para a caixa de pesquisa da GUI.
+# É construído uma vez a partir da BD (distritos, municípios e nomes detalhados dos
+# partidos) e depois cada tecla só percorre a trie: sem consultas SQL por tecla.
+#
+# Cada nome é guardado na trie a partir do início de cada palavra ("VILA FRANCA DE XIRA",
+# "FRANCA DE XIRA", ...), e cada nó guarda a lista das entradas que passam por ele, já pela
+# ordem de apresentação. Uma pesquisa por prefixo é só descer len(texto) nós.
+# Se houver poucos resultados, uma pesquisa aproximada (distância de Levenshtein)
+# sobre a mesma trie completa a lista, para apanhar erros de escrita.
+
+SEARCH_LIMIT = 12
+
+# Ordem de apresentação quando dois resultados empatam
+KIND_ORDER = {"district": 0, "municipality": 1, "party": 2}
+
+# Chave onde cada nó guarda as entradas (nunca colide com um carácter)
+IDS = ""
+
+
+def normalize(text):
+    # Mesma normalização do ETL (resolve_detailed_names): sem acentos e em maiúsculas;
+    # a pontuação passa a espaço para "PPD/PSD.CDS-PP" se pesquisar por qualquer sigla
+    text = unicodedata.normalize('NFKD', str(text)).encode('ASCII', 'ignore').decode('utf-8').upper()
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in text).split())
+
+
+def build_index(items):
+    # items: (tipo, texto apresentado, chave) com tipo em KIND_ORDER.
+    # Devolve {"entries": [(tipo, texto, chave, normalizado)], "trie": raiz}
+    entries = sorted(((kind, label, key, normalize(label)) for kind, label, key in items),
+                     key=lambda e: (KIND_ORDER[e[0]], e[3]))
+    trie = {IDS: []}
+
+    for eid, (_, _, _, norm) in enumerate(entries):
+        starts = [i for i, ch in enumerate(norm) if ch != " " and (i == 0 or norm[i - 1] == " ")]
+        for start in starts:
+            node = trie
+            for ch in norm[start:]:
+                node = node.setdefault(ch, {IDS: []})
+                # As palavras do mesmo nome entram seguidas: basta comparar com a última
+                if not node[IDS] or node[IDS][-1] != eid:
+                    node[IDS].append(eid)
+
+    return {"entries": entries, "trie": trie}
+
+
+def prefix_ids(trie, text):
+    node = trie
+    for ch in text:
+        node = node.get(ch)
+        if node is None:
+            return []
+    return node[IDS]
+
+
+def fuzzy_ids(trie, text, max_dist):
+    # Percorre a trie com uma linha da matriz de Levenshtein por nível e corta os ramos
+    # que já não podem ficar a max_dist ou menos. Um nó cujo prefixo está a essa distância
+    # do texto devolve todas as suas entradas (prefixo com erro de escrita).
+    found = {}
+    stack = [(trie, list(range(len(text) + 1)))]
+
+    while stack:
+        node, row = stack.pop()
+        for ch, child in node.items():
+            if ch == IDS:
+                continue
+            new_row = [row[0] + 1]
+            for i, tc in enumerate(text, 1):
+                new_row.append(min(new_row[i - 1] + 1, row[i] + 1, row[i - 1] + (tc != ch)))
+
+            if new_row[-1] <= max_dist:
+                for eid in child[IDS]:
+                    if new_row[-1] < found.get(eid, max_dist + 1):
+                        found[eid] = new_row[-1]
+            if min(new_row) <= max_dist:
+                stack.append((child, new_row))
+
+    return sorted(found, key=lambda eid: (found[eid], eid))
+
+
+def search(index, text, limit=SEARCH_LIMIT):
+    # Devolve até limit entradas: primeiro as que começam pelo texto, depois as que têm
+    # uma palavra começada pelo texto, e por fim (se faltarem) as aproximadas
+    text = normalize(text)
+    if not text:
+        return []
+    entries = index["entries"]
+
+    ids = sorted(prefix_ids(index["trie"], text),
+                 key=lambda eid: (not entries[eid][3].startswith(text), eid))[:limit]
+
+    if len(ids) < limit and len(text) >= 4:
+        seen = set(ids)
+        max_dist = 1 if len(text) <= 5 else 2
+        for eid in fuzzy_ids(index["trie"], text, max_dist):
+            if eid not in seen:
+                ids.append(eid)
+                if len(ids) == limit:
+                    break
+
+    return [entries[eid] for eid in ids]
@@ -1,21 +1,26 @@
 PRAGMA foreign_keys = ON;
 
-CREATE TABLE DISTRICTS (
+CREATE TABLE IF NOT EXISTS ELECTIONS (
+            YEAR INTEGER PRIMARY KEY,
+            NAME TEXT
+        );
+CREATE TABLE IF NOT EXISTS DISTRICTS (
             CODE INTEGER PRIMARY KEY,
             NAME TEXT,
             REGION TEXT
         );
-        CREATE TABLE MUNICIPALITIES (
+        CREATE TABLE IF NOT EXISTS MUNICIPALITIES (
             CODE INTEGER PRIMARY KEY,
             NAME TEXT,
             DISTRICT_CODE INTEGER,
             FOREIGN KEY(DISTRICT_CODE) REFERENCES DISTRICTS(CODE)
         );
-        CREATE TABLE PARTIES (
+        CREATE TABLE IF NOT EXISTS PARTIES (
             ACRONYM TEXT PRIMARY KEY,
             NAME TEXT
         );
-        CREATE TABLE VOTINGS (
+        CREATE TABLE IF NOT EXISTS VOTINGS (
+            ELECTION_YEAR INTEGER NOT NULL,
             MUNICIPALITY_CODE INTEGER,
             PARTY_ACRONYM TEXT,
             DETAILED_NAME TEXT,
@@ -24,19 +29,93 @@ CREATE TABLE DISTRICTS (
             TOTAL_VOTERS INTEGER,
             BLANK_VOTES INTEGER,
             NULL_VOTES INTEGER,
-            PRIMARY KEY (MUNICIPALITY_CODE, PARTY_ACRONYM),
+            PRIMARY KEY (ELECTION_YEAR, MUNICIPALITY_CODE, PARTY_ACRONYM),
+            FOREIGN KEY(ELECTION_YEAR) REFERENCES ELECTIONS(YEAR),
             FOREIGN KEY(MUNICIPALITY_CODE) REFERENCES MUNICIPALITIES(CODE),
             FOREIGN KEY(PARTY_ACRONYM) REFERENCES PARTIES(ACRONYM)
         );
 
-CREATE TABLE DISTRICT_SHAPE (
+-- Freguesias: CODE é o DICOFRE (6 dígitos = código do município + 2 dígitos)
+CREATE TABLE IF NOT EXISTS PARISHES (
+            CODE INTEGER PRIMARY KEY,
+            NAME TEXT,
+            MUNICIPALITY_CODE INTEGER,
+            FOREIGN KEY(MUNICIPALITY_CODE) REFERENCES MUNICIPALITIES(CODE)
+        );
+CREATE INDEX IF NOT EXISTS IDX_PARISHES_MUNICIPALITY ON PARISHES (MUNICIPALITY_CODE);
+
+CREATE TABLE IF NOT EXISTS PARISH_VOTINGS (
+            ELECTION_YEAR INTEGER NOT NULL,
+            PARISH_CODE INTEGER,
+            PARTY_ACRONYM TEXT,
+            DETAILED_NAME TEXT,
+            VOTES INTEGER,
+            MANDATES INTEGER DEFAULT 0,
+            TOTAL_VOTERS INTEGER,
+            BLANK_VOTES INTEGER,
+            NULL_VOTES INTEGER,
+            PRIMARY KEY (ELECTION_YEAR, PARISH_CODE, PARTY_ACRONYM),
+            FOREIGN KEY(ELECTION_YEAR) REFERENCES ELECTIONS(YEAR),
+            FOREIGN KEY(PARISH_CODE) REFERENCES PARISHES(CODE),
+            FOREIGN KEY(PARTY_ACRONYM) REFERENCES PARTIES(ACRONYM)
+        );
+
+CREATE TABLE IF NOT EXISTS DISTRICT_SHAPE (
     DISTRICT_CODE INTEGER PRIMARY KEY,
     GEOM_WKT TEXT NOT NULL,
     FOREIGN KEY (DISTRICT_CODE) REFERENCES DISTRICTS(CODE)
 );
 
-CREATE TABLE MUNICIPALITY_SHAPE (
+CREATE TABLE IF NOT EXISTS MUNICIPALITY_SHAPE (
     MUNICIPALITY_CODE INTEGER PRIMARY KEY,
     GEOM_WKT TEXT NOT NULL,
     FOREIGN KEY (MUNICIPALITY_CODE) REFERENCES MUNICIPALITIES(CODE)
 );
+
+-- Municípios vizinhos (calculado pelo built_geometry.py): cada par está nas duas direções,
+-- por isso a chave primária serve de índice para "vizinhos de X". BORDER_LENGTH na unidade da CAOP (m)
+CREATE TABLE IF NOT EXISTS MUNICIPALITY_ADJACENCY (
+    MUNICIPALITY_CODE INTEGER NOT NULL,
+    NEIGHBOUR_CODE INTEGER NOT NULL,
+    BORDER_LENGTH REAL,
+    PRIMARY KEY (MUNICIPALITY_CODE, NEIGHBOUR_CODE),
+    FOREIGN KEY (MUNICIPALITY_CODE) REFERENCES MUNICIPALITIES(CODE),
+    FOREIGN KEY (NEIGHBOUR_CODE) REFERENCES MUNICIPALITIES(CODE)
+) WITHOUT ROWID;
+
+-- Distritos vizinhos, derivados dos municípios (Açores = 40, Madeira = 30)
+CREATE VIEW IF NOT EXISTS DISTRICT_ADJACENCY AS
+    SELECT ma.DISTRICT_CODE AS DISTRICT_CODE, mb.DISTRICT_CODE AS NEIGHBOUR_CODE,
+           SUM(a.BORDER_LENGTH) AS BORDER_LENGTH
+    FROM MUNICIPALITY_ADJACENCY a
+    JOIN MUNICIPALITIES ma ON ma.CODE = a.MUNICIPALITY_CODE
+    JOIN MUNICIPALITIES mb ON mb.CODE = a.NEIGHBOUR_CODE
+    WHERE ma.DISTRICT_CODE <> mb.DISTRICT_CODE
+    GROUP BY ma.DISTRICT_CODE, mb.DISTRICT_CODE;
+
+-- Geometria das freguesias: lida só para o município selecionado (via IDX_PARISHES_MUNICIPALITY)
+CREATE TABLE IF NOT EXISTS PARISH_SHAPE (
+    PARISH_CODE INTEGER PRIMARY KEY,
+    GEOM_WKT TEXT NOT NULL,
+    FOREIGN KEY (PARISH_CODE) REFERENCES PARISHES(CODE)
+);
+
+-- Metadados de cada forma (calculados pelo built_geometry.py a partir de *_SHAPE):
+-- a GUI usa-os para o enquadramento, para colocar nomes e para saltar formas minúsculas
+-- sem percorrer as coordenadas. LEVEL: 'district' (códigos de DISTRICT_SHAPE), 'municipality', 'parish'
+CREATE TABLE IF NOT EXISTS SHAPE_META (
+    LEVEL TEXT NOT NULL,
+    CODE INTEGER NOT NULL,
+    MINX REAL, MINY REAL, MAXX REAL, MAXY REAL,
+    LABEL_X REAL, LABEL_Y REAL,
+    AREA REAL,
+    PARTS INTEGER,
+    VERTICES INTEGER,
+    PRIMARY KEY (LEVEL, CODE)
+);
+
+-- Extensão de cada região (C, A, M) no mapa geral
+CREATE TABLE IF NOT EXISTS REGION_EXTENT (
+    REGION TEXT PRIMARY KEY,
+    MINX REAL, MINY REAL, MAXX REAL, MAXY REAL
+);
@@ -1,11 +1,18 @@
 import sqlite3
 import fiona
+import numpy as np
+import shapely
 from shapely.geometry import shape
+from shapely import wkt as shapely_wkt
+from shapely.ops import polylabel
 import os
+from concurrent.futures import ThreadPoolExecutor
+from snapshot import building_snapshot
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__)) #wheres the built-geometry; tells that PROJECT_ROTT its the parent
 PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, "..")) #its telling that root of built_geometry its ".." so OK
 DB_FILE = os.path.join(PROJECT_ROOT, "db", "elections.db") #ABSOLUTE path to find the database!
+DDL_PATH = os.path.join(PROJECT_ROOT, "db", "create_tables.sql")
 
 
 #Have this to 2 defined so doesnt matter if the files are inside CAOP_* directories or outside
@@ -38,6 +45,13 @@ LAYER_MUNICIPS = [
     "ram_municipios",
 ]
 
+LAYER_PARISHES = [
+    "cont_freguesias",
+    "raa_cen_ori_freguesias",
+    "raa_oci_freguesias",
+    "ram_freguesias",
+]
+
 def find_gpkg_path(caop_dir, explicit_relative=None):
     base = os.path.join(PROJECT_ROOT, caop_dir)
 
@@ -105,20 +119,173 @@ def load_municipality_shapes(cur):
                     (mun_code, geom),
                 )
 
+# Pares candidatos por tarefa no cálculo das fronteiras comuns
+ADJACENCY_CHUNK = 256
+
+def border_lengths(boundaries, left, right):
+    # Comprimento da fronteira comum de cada par (vetorizado: o GEOS corre sem o GIL)
+    return shapely.length(shapely.intersection(boundaries[left], boundaries[right]))
+
+def load_municipality_adjacency(cur, workers=None):
+    # Grafo de vizinhança dos municípios, a partir de MUNICIPALITY_SHAPE.
+    # Uma STRtree dá os pares cujas formas se intersetam (em vez de 308 x 308 testes),
+    # e as fronteiras comuns são medidas em paralelo. Pares que só se tocam num ponto
+    # (comprimento 0) não contam como vizinhos.
+    rows = cur.execute("SELECT MUNICIPALITY_CODE, GEOM_WKT FROM MUNICIPALITY_SHAPE").fetchall()
+    cur.execute("DELETE FROM MUNICIPALITY_ADJACENCY")
+    if not rows:
+        return
+
+    codes = [code for code, _ in rows]
+    geoms = shapely.from_wkt([geom for _, geom in rows])
+    boundaries = shapely.boundary(geoms)
+
+    left, right = shapely.STRtree(geoms).query(geoms, predicate="intersects")
+    keep = left < right
+    left, right = left[keep], right[keep]
+
+    chunks = [(left[i:i + ADJACENCY_CHUNK], right[i:i + ADJACENCY_CHUNK])
+              for i in range(0, len(left), ADJACENCY_CHUNK)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        lengths = list(pool.map(lambda c: border_lengths(boundaries, *c), chunks))
+    lengths = np.concatenate(lengths) if lengths else np.empty(0)
+
+    pairs = [(codes[a], codes[b], float(length))
+             for a, b, length in zip(left, right, lengths) if length > 0]
+    cur.executemany(
+        """
+        INSERT OR REPLACE INTO MUNICIPALITY_ADJACENCY
+        (MUNICIPALITY_CODE, NEIGHBOUR_CODE, BORDER_LENGTH)
+        VALUES (?, ?, ?)
+        """,
+        pairs + [(b, a, length) for a, b, length in pairs],
+    )
+    print(f"   {len(pairs)} pares de municípios vizinhos")
+
+def load_parish_shapes(cur):
+    # ~3000 freguesias: a GUI só as lê por município (PARISHES.MUNICIPALITY_CODE),
+    # por isso o código do município é guardado junto com cada freguesia
+    for i in range(len(LAYER_PARISHES)):
+        gpkg_file = find_gpkg_path(CAOP_PATH[i], GPKG_PATH[i])
+        with fiona.open(gpkg_file, layer=LAYER_PARISHES[i]) as src:
+            for feat in src:
+                props = feat["properties"]
+
+                par_code = props.get("dtmnfr")
+                if not par_code:
+                    continue
+                mun_code = int(str(par_code)[:4])
+                par_code = int(par_code)
+                geom = shape(feat["geometry"]).wkt
+                # Freguesias sem resultados carregados ainda não existem em PARISHES
+                cur.execute(
+                    """
+                    INSERT OR IGNORE INTO PARISHES
+                    (CODE, NAME, MUNICIPALITY_CODE)
+                    VALUES (?, ?, ?)
+                    """,
+                    (par_code, props.get("freguesia"), mun_code),
+                )
+                # Freguesias carregadas pelo ETL sem nome (ficheiro AF sem coluna FREG)
+                cur.execute(
+                    "UPDATE PARISHES SET NAME = ? WHERE CODE = ? AND NAME IS NULL",
+                    (props.get("freguesia"), par_code),
+                )
+                cur.execute(
+                    """
+                    INSERT OR REPLACE INTO PARISH_SHAPE
+                    (PARISH_CODE, GEOM_WKT)
+                    VALUES (?, ?)
+                    """,
+                    (par_code, geom),
+                )
+
+# (nível em SHAPE_META, tabela, coluna do código)
+SHAPE_TABLES = [
+    ("district", "DISTRICT_SHAPE", "DISTRICT_CODE"),
+    ("municipality", "MUNICIPALITY_SHAPE", "MUNICIPALITY_CODE"),
+    ("parish", "PARISH_SHAPE", "PARISH_CODE"),
+]
+
+# Precisão do ponto para o nome, em fração do maior lado da parte maior
+LABEL_TOLERANCE = 0.01
+
+def shape_metadata(geom):
+    # (minx, miny, maxx, maxy, label_x, label_y, área, partes, vértices).
+    # O nome fica no polo de inacessibilidade da maior parte (o ponto interior mais
+    # afastado da fronteira), que ao contrário do centróide nunca cai fora da forma.
+    # Os vértices contam só os anéis exteriores, que são os que a GUI desenha.
+    parts = list(geom.geoms) if geom.geom_type == "MultiPolygon" else [geom]
+    minx, miny, maxx, maxy = geom.bounds
+    largest = max(parts, key=lambda p: p.area)
+    p_minx, p_miny, p_maxx, p_maxy = largest.bounds
+    tolerance = max(p_maxx - p_minx, p_maxy - p_miny) * LABEL_TOLERANCE or 1e-9
+    try:
+        label = polylabel(largest, tolerance)
+    except Exception:
+        label = largest.representative_point()
+    vertices = sum(len(p.exterior.coords) for p in parts)
+    return (minx, miny, maxx, maxy, label.x, label.y, geom.area, len(parts), vertices)
+
+def load_shape_metadata(cur):
+    # Corre depois das geometrias: lê o WKT guardado e grava SHAPE_META e REGION_EXTENT
+    for level, table, code_col in SHAPE_TABLES:
+        rows = cur.execute(f"SELECT {code_col}, GEOM_WKT FROM {table}").fetchall()
+        cur.execute("DELETE FROM SHAPE_META WHERE LEVEL = ?", (level,))
+        cur.executemany(
+            """
+            INSERT INTO SHAPE_META
+            (LEVEL, CODE, MINX, MINY, MAXX, MAXY, LABEL_X, LABEL_Y, AREA, PARTS, VERTICES)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            ((level, code) + shape_metadata(shapely_wkt.loads(geom)) for code, geom in rows),
+        )
+
+    # As formas das ilhas usam códigos 31-39 (Madeira) e 41-49 (Açores), como na GUI
+    cur.execute("DELETE FROM REGION_EXTENT")
+    cur.execute(
+        """
+        INSERT INTO REGION_EXTENT (REGION, MINX, MINY, MAXX, MAXY)
+        SELECT d.REGION, MIN(s.MINX), MIN(s.MINY), MAX(s.MAXX), MAX(s.MAXY)
+        FROM SHAPE_META s
+        JOIN DISTRICTS d
+          ON (
+                s.CODE = d.CODE
+             OR (d.CODE = 30 AND s.CODE BETWEEN 30 AND 39)
+             OR (d.CODE = 40 AND s.CODE BETWEEN 40 AND 49)
+          )
+        WHERE s.LEVEL = 'district'
+        GROUP BY d.REGION
+        """
+    )
+
 def main():
     if not os.path.exists(DB_FILE):
         raise FileNotFoundError("elections.db not found. Run etl.py first.")
 
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    load_district_shapes(cur)
-    load_municipality_shapes(cur)
-    cur.execute("PRAGMA foreign_keys = ON;")
-    conn.commit()
-    conn.close()
+    # Escreve numa cópia da BD, trocada atomicamente no fim (ver snapshot.py)
+    with building_snapshot(DB_FILE, required_tables=["DISTRICT_SHAPE", "MUNICIPALITY_SHAPE"]) as build_file:
+        conn = sqlite3.connect(build_file)
+        # BDs criadas antes de SHAPE_META/REGION_EXTENT (o DDL usa IF NOT EXISTS)
+        with open(DDL_PATH, "r", encoding="utf-8") as ddl_file:
+            conn.executescript(ddl_file.read())
+        # O DDL liga as chaves estrangeiras, mas as formas das ilhas (31-49) não existem em DISTRICTS
+        conn.execute("PRAGMA foreign_keys = OFF;")
+        cur = conn.cursor()
+        load_district_shapes(cur)
+        load_municipality_shapes(cur)
+        load_municipality_adjacency(cur)
+        load_parish_shapes(cur)
+        load_shape_metadata(cur)
+        cur.execute("PRAGMA foreign_keys = ON;")
+        conn.commit()
+        conn.close()
 
     print("✅ District geometry loaded ✅")
     print("✅ Municipality geometry loaded ✅")
+    print("✅ Municipality adjacency computed ✅")
+    print("✅ Parish geometry loaded ✅")
+    print("✅ Shape metadata computed ✅")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,249 @@
+import sqlite3
+import os
+import csv
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# --- CONFIGURAÇÃO ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, ".."))
+DB_FILE = os.path.join(PROJECT_ROOT, "db", "elections.db")
+EXPORT_DIR = os.path.join(PROJECT_ROOT, "exports")
+
+# Linhas lidas do SQLite de cada vez: nunca há mais do que isto em memória por ficheiro
+CHUNK_ROWS = 50_000
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+# Colunas de cada nível: (nome, tipo) — o tipo só é usado em Parquet/Arrow
+COLUMNS = {
+    "districts": [
+        ("ELECTION_YEAR", "int"), ("DISTRICT_CODE", "int"), ("DISTRICT", "str"),
+        ("DETAILED_NAME", "str"), ("VOTES", "int"), ("MANDATES", "int"),
+        ("TOTAL_VOTERS", "int"), ("BLANK_VOTES", "int"), ("NULL_VOTES", "int"),
+    ],
+    "municipalities": [
+        ("ELECTION_YEAR", "int"), ("DISTRICT_CODE", "int"), ("DISTRICT", "str"),
+        ("MUNICIPALITY_CODE", "int"), ("MUNICIPALITY", "str"),
+        ("PARTY_ACRONYM", "str"), ("DETAILED_NAME", "str"), ("VOTES", "int"), ("MANDATES", "int"),
+        ("TOTAL_VOTERS", "int"), ("BLANK_VOTES", "int"), ("NULL_VOTES", "int"),
+    ],
+    "parishes": [
+        ("ELECTION_YEAR", "int"), ("DISTRICT_CODE", "int"), ("DISTRICT", "str"),
+        ("MUNICIPALITY_CODE", "int"), ("MUNICIPALITY", "str"),
+        ("PARISH_CODE", "int"), ("PARISH", "str"),
+        ("PARTY_ACRONYM", "str"), ("DETAILED_NAME", "str"), ("VOTES", "int"), ("MANDATES", "int"),
+        ("TOTAL_VOTERS", "int"), ("BLANK_VOTES", "int"), ("NULL_VOTES", "int"),
+    ],
+}
+
+# {where} recebe os filtros opcionais (eleição, distrito, município, freguesia)
+LEVEL_SQL = {
+    # Os totais de eleitores/brancos/nulos repetem-se em cada partido do município:
+    # somam-se uma vez por município antes de agregar por distrito
+    "districts": """
+        WITH mun_stats AS (
+            SELECT v.ELECTION_YEAR, m.DISTRICT_CODE,
+                   MAX(v.TOTAL_VOTERS) AS TOTAL_VOTERS, MAX(v.BLANK_VOTES) AS BLANK_VOTES,
+                   MAX(v.NULL_VOTES) AS NULL_VOTES
+            FROM VOTINGS v
+            JOIN MUNICIPALITIES m ON m.CODE = v.MUNICIPALITY_CODE
+            WHERE {where}
+            GROUP BY v.ELECTION_YEAR, v.MUNICIPALITY_CODE
+        ),
+        dist_stats AS (
+            SELECT ELECTION_YEAR, DISTRICT_CODE, SUM(TOTAL_VOTERS) AS TOTAL_VOTERS,
+                   SUM(BLANK_VOTES) AS BLANK_VOTES, SUM(NULL_VOTES) AS NULL_VOTES
+            FROM mun_stats
+            GROUP BY ELECTION_YEAR, DISTRICT_CODE
+        )
+        SELECT v.ELECTION_YEAR, d.CODE, d.NAME, v.DETAILED_NAME,
+               SUM(v.VOTES), SUM(v.MANDATES),
+               s.TOTAL_VOTERS, s.BLANK_VOTES, s.NULL_VOTES
+        FROM VOTINGS v
+        JOIN MUNICIPALITIES m ON m.CODE = v.MUNICIPALITY_CODE
+        JOIN DISTRICTS d ON d.CODE = m.DISTRICT_CODE
+        JOIN dist_stats s ON s.ELECTION_YEAR = v.ELECTION_YEAR AND s.DISTRICT_CODE = d.CODE
+        WHERE {where}
+        GROUP BY v.ELECTION_YEAR, d.CODE, v.DETAILED_NAME
+        ORDER BY v.ELECTION_YEAR, d.CODE, SUM(v.VOTES) DESC
+    """,
+    "municipalities": """
+        SELECT v.ELECTION_YEAR, d.CODE, d.NAME, m.CODE, m.NAME,
+               v.PARTY_ACRONYM, v.DETAILED_NAME, v.VOTES, v.MANDATES,
+               v.TOTAL_VOTERS, v.BLANK_VOTES, v.NULL_VOTES
+        FROM VOTINGS v
+        JOIN MUNICIPALITIES m ON m.CODE = v.MUNICIPALITY_CODE
+        JOIN DISTRICTS d ON d.CODE = m.DISTRICT_CODE
+        WHERE {where}
+        ORDER BY v.ELECTION_YEAR, m.CODE, v.VOTES DESC
+    """,
+    "parishes": """
+        SELECT v.ELECTION_YEAR, d.CODE, d.NAME, m.CODE, m.NAME, p.CODE, p.NAME,
+               v.PARTY_ACRONYM, v.DETAILED_NAME, v.VOTES, v.MANDATES,
+               v.TOTAL_VOTERS, v.BLANK_VOTES, v.NULL_VOTES
+        FROM PARISH_VOTINGS v
+        JOIN PARISHES p ON p.CODE = v.PARISH_CODE
+        JOIN MUNICIPALITIES m ON m.CODE = p.MUNICIPALITY_CODE
+        JOIN DISTRICTS d ON d.CODE = m.DISTRICT_CODE
+        WHERE {where}
+        ORDER BY v.ELECTION_YEAR, p.CODE, v.VOTES DESC
+    """,
+}
+
+
+def level_query(level, year=None, district=None, municipality=None, parish=None):
+    # Devolve (sql, args) para exportar um nível, opcionalmente filtrado
+    where, args = ["1 = 1"], []
+    if year is not None:
+        where.append("v.ELECTION_YEAR = ?")
+        args.append(year)
+    if district is not None:
+        where.append("m.DISTRICT_CODE = ?")
+        args.append(district)
+    if municipality is not None:
+        where.append("m.CODE = ?")
+        args.append(municipality)
+    if parish is not None:
+        if level != "parishes":
+            raise ValueError("Filtro por freguesia só existe no nível 'parishes'")
+        where.append("p.CODE = ?")
+        args.append(parish)
+
+    sql = LEVEL_SQL[level].format(where=" AND ".join(where))
+    # No nível distrital o filtro aparece duas vezes (CTE e consulta principal)
+    if level == "districts":
+        args = args * 2
+    return sql, args
+
+
+def iter_chunks(cursor):
+    while True:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        yield rows
+
+
+def write_csv(cursor, columns, path):
+    rows_out = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in columns])
+        for rows in iter_chunks(cursor):
+            writer.writerows(rows)
+            rows_out += len(rows)
+    return rows_out
+
+
+def arrow_schema(columns):
+    import pyarrow as pa
+    types = {"int": pa.int64(), "str": pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def iter_record_batches(cursor, schema):
+    import pyarrow as pa
+    for rows in iter_chunks(cursor):
+        arrays = [pa.array(col, type=field.type) for col, field in zip(zip(*rows), schema)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(cursor, columns, path):
+    import pyarrow.parquet as pq
+    schema = arrow_schema(columns)
+    rows_out = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in iter_record_batches(cursor, schema):
+            writer.write_batch(batch)
+            rows_out += batch.num_rows
+    return rows_out
+
+
+def write_arrow(cursor, columns, path):
+    import pyarrow as pa
+    schema = arrow_schema(columns)
+    rows_out = 0
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in iter_record_batches(cursor, schema):
+            writer.write_batch(batch)
+            rows_out += batch.num_rows
+    return rows_out
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet, "arrow": write_arrow}
+
+
+def export_level(level, fmt, path, db_file=None, **filters):
+    # Exporta um nível para um ficheiro, lendo a BD por blocos.
+    # Devolve (linhas, bytes, segundos). Cada chamada usa a sua própria ligação,
+    # por isso pode correr em paralelo com outras exportações.
+    if fmt in ("parquet", "arrow"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError(f"O formato '{fmt}' requer pyarrow (pip install pyarrow)")
+
+    t0 = time.perf_counter()
+    sql, args = level_query(level, **filters)
+    conn = sqlite3.connect(db_file or DB_FILE)
+    try:
+        cursor = conn.execute(sql, args)
+        rows = WRITERS[fmt](cursor, COLUMNS[level], path)
+    finally:
+        conn.close()
+    return rows, os.path.getsize(path), time.perf_counter() - t0
+
+
+def export_many(jobs, workers=None, db_file=None):
+    # jobs: lista de (nível, formato, caminho, filtros). Corre as exportações em
+    # paralelo e mostra o débito de cada uma.
+    def run(job):
+        level, fmt, path, filters = job
+        return job, export_level(level, fmt, path, db_file, **filters)
+
+    t0 = time.perf_counter()
+    total_rows = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for (level, fmt, path, _), (rows, size, secs) in pool.map(run, jobs):
+            total_rows += rows
+            print(f"   {os.path.basename(path):<32}{rows:>10} linhas {size / 1e6:>8.2f} MB "
+                  f"{rows / max(secs, 1e-9):>12,.0f} linhas/s {size / 1e6 / max(secs, 1e-9):>8.1f} MB/s")
+    elapsed = time.perf_counter() - t0
+    print(f"Total: {total_rows} linhas em {elapsed:.2f}s ({total_rows / max(elapsed, 1e-9):,.0f} linhas/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportação em massa dos resultados (CSV, Parquet, Arrow)")
+    parser.add_argument("--level", nargs="+", choices=list(COLUMNS) + ["all"], default=["all"])
+    parser.add_argument("--format", nargs="+", choices=list(FORMATS), default=["csv"])
+    parser.add_argument("--year", type=int, default=None, help="só esta eleição (por omissão, todas)")
+    parser.add_argument("--out", default=EXPORT_DIR, help="pasta de destino")
+    parser.add_argument("--workers", type=int, default=None, help="exportações em paralelo")
+    args = parser.parse_args()
+
+    if not os.path.exists(DB_FILE):
+        raise FileNotFoundError("elections.db not found. Run etl.py first.")
+    conn = sqlite3.connect(DB_FILE)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ELECTIONS'").fetchone():
+        conn.close()
+        raise SystemExit("BD no formato antigo (sem ELECTIONS). Run etl.py first.")
+    conn.close()
+
+    levels = list(COLUMNS) if "all" in args.level else args.level
+    os.makedirs(args.out, exist_ok=True)
+    suffix = args.year if args.year is not None else "all"
+
+    jobs = []
+    for level in levels:
+        for fmt in args.format:
+            path = os.path.join(args.out, f"{level}_{suffix}{FORMATS[fmt]}")
+            jobs.append((level, fmt, path, {"year": args.year}))
+
+    print(f"--- A exportar {len(jobs)} ficheiros para {args.out} ---")
+    export_many(jobs, args.workers)
+
+
+if __name__ == "__main__":
+    main()
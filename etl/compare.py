@@ -0,0 +1,89 @@
+import sqlite3
+import os
+import argparse
+
+# --- CONFIGURAÇÃO ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, ".."))
+DB_FILE = os.path.join(PROJECT_ROOT, "db", "elections.db")
+
+# As duas eleições são lidas por intervalos da chave primária de VOTINGS
+# (ELECTION_YEAR é a primeira coluna), numa só passagem com agregação condicional
+# em vez de um self-join; as percentagens usam os totais de cada município nesse ano.
+# As candidaturas são identificadas pelo DETAILED_NAME: as siglas de coligações e grupos
+# de cidadãos ([A], [B], ...) são só a posição no boletim e podem ser listas diferentes
+# em cada eleição; as que ficaram por resolver no ETL são excluídas.
+PARTY_DELTA_SQL = """
+    WITH totals AS (
+        SELECT ELECTION_YEAR, MUNICIPALITY_CODE, SUM(VOTES) AS TOTAL
+        FROM VOTINGS
+        WHERE ELECTION_YEAR IN (:year_from, :year_to)
+        GROUP BY ELECTION_YEAR, MUNICIPALITY_CODE
+    ),
+    pairs AS (
+        SELECT v.MUNICIPALITY_CODE, v.DETAILED_NAME,
+               SUM(CASE WHEN v.ELECTION_YEAR = :year_from THEN v.VOTES END) AS VOTES_FROM,
+               SUM(CASE WHEN v.ELECTION_YEAR = :year_to THEN v.VOTES END) AS VOTES_TO
+        FROM VOTINGS v
+        WHERE v.ELECTION_YEAR IN (:year_from, :year_to)
+          AND v.DETAILED_NAME NOT LIKE '[%'
+          AND (:party IS NULL OR v.PARTY_ACRONYM = :party OR v.DETAILED_NAME = :party)
+        GROUP BY v.MUNICIPALITY_CODE, v.DETAILED_NAME
+    )
+    SELECT m.CODE, m.NAME, p.DETAILED_NAME,
+           COALESCE(p.VOTES_FROM, 0), COALESCE(p.VOTES_TO, 0),
+           COALESCE(p.VOTES_TO, 0) - COALESCE(p.VOTES_FROM, 0) AS DELTA,
+           ROUND(COALESCE(100.0 * p.VOTES_TO / NULLIF(tt.TOTAL, 0), 0)
+               - COALESCE(100.0 * p.VOTES_FROM / NULLIF(tf.TOTAL, 0), 0), 2) AS SHARE_DELTA
+    FROM pairs p
+    JOIN MUNICIPALITIES m ON m.CODE = p.MUNICIPALITY_CODE
+    LEFT JOIN totals tf ON tf.ELECTION_YEAR = :year_from AND tf.MUNICIPALITY_CODE = p.MUNICIPALITY_CODE
+    LEFT JOIN totals tt ON tt.ELECTION_YEAR = :year_to AND tt.MUNICIPALITY_CODE = p.MUNICIPALITY_CODE
+    WHERE COALESCE(p.VOTES_FROM, 0) > 0 OR COALESCE(p.VOTES_TO, 0) > 0
+"""
+
+
+def elections(conn):
+    # Anos carregados, do mais antigo para o mais recente
+    return [r[0] for r in conn.execute("SELECT YEAR FROM ELECTIONS ORDER BY YEAR")]
+
+
+def party_delta(conn, year_from, year_to, party=None):
+    # Variação de votos e de percentagem (pontos percentuais) por município e candidatura
+    # entre duas eleições. Devolve (código, município, candidatura, votos_de, votos_para,
+    # delta_votos, delta_pp), ordenado pela maior subida de percentagem.
+    return conn.execute(PARTY_DELTA_SQL + " ORDER BY SHARE_DELTA DESC",
+                        {"year_from": year_from, "year_to": year_to, "party": party}).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparação de resultados entre duas eleições")
+    parser.add_argument("year_from", type=int)
+    parser.add_argument("year_to", type=int)
+    parser.add_argument("--party", help="sigla ou nome detalhado (p.ex. PS ou 'PPD/PSD.CDS-PP')")
+    parser.add_argument("--top", type=int, default=20, help="nº de linhas a mostrar")
+    args = parser.parse_args()
+
+    if not os.path.exists(DB_FILE):
+        raise FileNotFoundError("elections.db not found. Run etl.py first.")
+
+    conn = sqlite3.connect(DB_FILE)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ELECTIONS'").fetchone():
+        conn.close()
+        raise SystemExit("BD no formato antigo (sem ELECTIONS). Run etl.py first.")
+    loaded = elections(conn)
+    for year in (args.year_from, args.year_to):
+        if year not in loaded:
+            conn.close()
+            raise SystemExit(f"Eleição {year} não carregada (disponíveis: {loaded})")
+
+    rows = party_delta(conn, args.year_from, args.year_to, args.party)
+    conn.close()
+
+    print(f"{'Município':<28}{'Candidatura':<24}{args.year_from:>10}{args.year_to:>10}{'Δ votos':>10}{'Δ p.p.':>9}")
+    for code, name, party, v_from, v_to, delta, share_delta in rows[:args.top]:
+        print(f"{name:<28}{party[:23]:<24}{v_from:>10}{v_to:>10}{delta:>+10}{share_delta:>+9.2f}")
+
+
+if __name__ == "__main__":
+    main()
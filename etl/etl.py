@@ -2,7 +2,16 @@ import pandas as pd
 import sqlite3
 import os
 import re
+import sys
+import gc
+import argparse
 import unicodedata
+from snapshot import building_snapshot
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 # --- CONFIGURAÇÃO ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -13,6 +22,18 @@ EXCEL_FILE_MANDATES = os.path.join(PROJECT_ROOT, "data", "mapa_2_perc_mandatos_m
 DB_FILE = os.path.join(PROJECT_ROOT, "db", "elections.db")
 DDL_PATH = os.path.join(PROJECT_ROOT, "db", "create_tables.sql")
 
+# Eleição carregada por omissão (ficheiros em /data); as BDs antigas, sem
+# dimensão de eleição, só tinham esta
+DEFAULT_ELECTION_YEAR = 2021
+
+# Tabelas preenchidas por built_geometry.py (mantidas num --rebuild)
+GEOMETRY_TABLES = ['PARISHES', 'DISTRICT_SHAPE', 'MUNICIPALITY_SHAPE', 'PARISH_SHAPE',
+                   'SHAPE_META', 'REGION_EXTENT', 'MUNICIPALITY_ADJACENCY']
+
+# Modo low-memory: municípios por bloco e linhas por INSERT em lote
+CHUNK_MUNICIPALITIES = 50
+SQL_BATCH = 1000
+
 # Mapeamento de siglas para nomes completos
 PARTY_MAPPING = {
     'PS': 'Partido Socialista',
@@ -119,23 +140,25 @@ def read_excel_robust(filepath):
          
     return df
 
-def clean_identifiers(df):
-    # Filtra apenas Câmaras Municipais e normaliza códigos (6 dígitos)
+def clean_identifiers(df, organ='CM'):
+    # Filtra apenas o órgão pedido (CM = Câmaras Municipais, AF = Assembleias de Freguesia)
+    # e normaliza códigos (6 dígitos)
     if 'ÓRG' in df.columns:
-        df = df[df['ÓRG'] == 'CM'].copy()
+        df = df[df['ÓRG'] == organ].copy()
     if 'DIST' in df.columns:
         df['DIST'] = df['DIST'].ffill()
         
     df['CÓD'] = df['CÓD'].astype(str).apply(lambda x: x.split('.')[0]).str.zfill(6)
     df['DIST_ID'] = df['CÓD'].str.slice(0, 2).astype(int)
     df['CONC_ID'] = df['CÓD'].str.slice(0, 4).astype(int)
+    df['FREG_ID'] = df['CÓD'].astype(int)
     
     # Normaliza distritos das ilhas
     df['DIST_ID'] = df['DIST_ID'].apply(lambda x: 30 if 30 <= x < 40 else (40 if 40 <= x < 50 else x))
     return df
 
-def resolve_detailed_names(df_votes, df_source):
-    # Preenche o nome detalhado usando regex para coligações/GCE e o dicionário global para partidos
+def build_real_name_map(df_source, key='CONC_ID'):
+    # Mapa (município ou freguesia, letra) -> nome real das coligações/GCE, lido das colunas de descrição
     print("Resolvendo nomes detalhados...")
     
     def normalize_str(s):
@@ -153,7 +176,7 @@ def resolve_detailed_names(df_votes, df_source):
     real_name_map = {}
     
     for idx, row in df_source.iterrows():
-        conc_id = row['CONC_ID']
+        conc_id = row[key]
         
         # Coligações
         if col_coalition and pd.notna(row[col_coalition]):
@@ -179,6 +202,12 @@ def resolve_detailed_names(df_votes, df_source):
             elif len(raw_text) > 1:
                 real_name_map[(conc_id, '[D]')] = raw_text 
 
+    return real_name_map
+
+def resolve_detailed_names(df_votes, df_source, real_name_map=None, key='CONC_ID'):
+    # Preenche o nome detalhado usando regex para coligações/GCE e o dicionário global para partidos
+    if real_name_map is None:
+        real_name_map = build_real_name_map(df_source, key)
 
     def get_full_name(row):
         acronym = row['PARTY_ACRONYM']
@@ -196,7 +225,7 @@ def resolve_detailed_names(df_votes, df_source):
     df_votes['DETAILED_NAME'] = df_votes.apply(get_full_name, axis=1)
     return df_votes
 
-def process_mandates_file(filepath):
+def process_mandates_file(filepath, organ='CM', key='CONC_ID'):
     # Processa ficheiro de mandatos (nomes na linha X, tipos na linha X+1)
     print("Processando mandatos...")
     try:
@@ -229,25 +258,20 @@ def process_mandates_file(filepath):
         if val_type == 'M' and current_party:
             mandate_map[col_name] = current_party
 
-    keep_cols = ['CONC_ID'] + list(mandate_map.keys())
+    keep_cols = [key] + list(mandate_map.keys())
     
-    df_clean = clean_identifiers(df)
+    df_clean = clean_identifiers(df, organ)
     df_mandates = df_clean[keep_cols].copy()
     df_mandates = df_mandates.rename(columns=mandate_map)
     
-    df_melted = df_mandates.melt(id_vars=['CONC_ID'], var_name='PARTY_ACRONYM', value_name='MANDATES')
+    df_melted = df_mandates.melt(id_vars=[key], var_name='PARTY_ACRONYM', value_name='MANDATES')
     df_melted['MANDATES'] = pd.to_numeric(df_melted['MANDATES'], errors='coerce').fillna(0).astype(int)
     
     return df_melted
 
-def run_etl():
-    # 1. Leitura e Limpeza
-    df_res = read_excel_robust(EXCEL_FILE_RESULTS)
-    if df_res is None: return
-    df_res = clean_identifiers(df_res)
-    
+def detect_parties(df_res):
     # Identificar partidos reais (excluir metadados)
-    cols_fixed = ['CÓD', 'DIST', 'CONC', 'ÓRG', 'INSC', 'VOT', 'BR', 'NUL', 'DIST_ID', 'CONC_ID']
+    cols_fixed = ['CÓD', 'DIST', 'CONC', 'FREG', 'ÓRG', 'INSC', 'VOT', 'BR', 'NUL', 'DIST_ID', 'CONC_ID', 'FREG_ID']
     parties = []
     
     for c in df_res.columns:
@@ -256,6 +280,234 @@ def run_etl():
             parties.append(c)
 
     print(f"Partidos detetados: {len(parties)}")
+    return parties
+
+def current_rss_mb():
+    # RSS atual do processo (Linux: /proc/self/statm, em páginas); None noutras plataformas
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+def report_memory(stage, budget_mb=None):
+    # Mostra a memória (RSS) no fim da etapa e o pico do processo até aí.
+    # O pico (ru_maxrss) só sobe, por isso depois da etapa mais pesada repete-se;
+    # é o RSS atual que mostra quanto cada etapa deixa ocupado.
+    # Com budget_mb, aborta se o pico ultrapassar o orçamento definido.
+    rss_mb = current_rss_mb()
+    rss = f"{rss_mb:.1f} MB" if rss_mb is not None else "n/d"
+    if resource is None:
+        print(f"[mem] {stage}: RSS atual = {rss} (pico indisponível nesta plataforma)")
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux devolve KB, macOS devolve bytes
+    peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    print(f"[mem] {stage}: RSS atual = {rss}, pico RSS = {peak_mb:.1f} MB")
+    if budget_mb is not None and peak_mb > budget_mb:
+        raise MemoryError(f"Orçamento de memória excedido em '{stage}': {peak_mb:.1f} MB > {budget_mb} MB")
+    return peak_mb
+
+def downcast_ints(df, columns):
+    # Converte colunas numéricas para o menor tipo inteiro possível
+    for c in columns:
+        df[c] = pd.to_numeric(pd.to_numeric(df[c], errors='coerce').fillna(0), downcast='integer')
+    return df
+
+def migrate_legacy_votings(conn):
+    # BDs criadas antes da dimensão de eleição: VOTINGS sem ELECTION_YEAR.
+    # Renomeia a tabela antiga para ser recriada pelo DDL e copiada como 2021.
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(VOTINGS)")]
+    if not cols or 'ELECTION_YEAR' in cols:
+        return False
+    print(f"--- A migrar VOTINGS antiga para a eleição {DEFAULT_ELECTION_YEAR} ---")
+    conn.execute("ALTER TABLE VOTINGS RENAME TO VOTINGS_LEGACY")
+    return True
+
+def open_database(db_file):
+    # Abre (ou cria) a base de dados e aplica o DDL.
+    # O DDL usa IF NOT EXISTS, por isso pode ser reaplicado a uma BD já carregada.
+    if not os.path.exists(DDL_PATH):
+        raise FileNotFoundError(f"DDL não encontrado: {DDL_PATH}")
+
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+
+    # Ativar FK
+    cursor.execute("PRAGMA foreign_keys = ON;")
+    legacy = migrate_legacy_votings(conn)
+
+    # Executar DDL externo
+    print(f"--- A executar DDL: {DDL_PATH} ---")
+    with open(DDL_PATH, "r", encoding="utf-8") as ddl_file:
+        ddl_sql = ddl_file.read()
+    cursor.executescript(ddl_sql)
+
+    if legacy:
+        cursor.execute("INSERT OR IGNORE INTO ELECTIONS (YEAR, NAME) VALUES (?, ?)",
+                       (DEFAULT_ELECTION_YEAR, election_name(DEFAULT_ELECTION_YEAR)))
+        cursor.execute("""
+            INSERT INTO VOTINGS
+            SELECT ?, MUNICIPALITY_CODE, PARTY_ACRONYM, DETAILED_NAME, VOTES, MANDATES,
+                   TOTAL_VOTERS, BLANK_VOTES, NULL_VOTES
+            FROM VOTINGS_LEGACY
+        """, (DEFAULT_ELECTION_YEAR,))
+        cursor.execute("DROP TABLE VOTINGS_LEGACY")
+        conn.commit()
+    return conn
+
+def is_legacy_database(db_file):
+    # BD criada antes da dimensão de eleição (p.ex. a db/elections.db do repositório)
+    if not os.path.exists(db_file):
+        return False
+    conn = sqlite3.connect(db_file)
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(VOTINGS)")]
+    conn.close()
+    return bool(cols) and 'ELECTION_YEAR' not in cols
+
+def migrate_database(db_file):
+    # Converte uma BD antiga (2021) para o esquema atual, numa snapshot como as cargas
+    with building_snapshot(db_file, required_tables=['ELECTIONS', 'VOTINGS']) as build_file:
+        conn = open_database(build_file)
+        conn.commit()
+        conn.close()
+
+def loaded_elections(db_file):
+    # Anos já carregados na BD em uso (a BD tem de estar migrada: ver migrate_database)
+    if not os.path.exists(db_file):
+        return set()
+    conn = sqlite3.connect(db_file)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    years = {r[0] for r in conn.execute("SELECT YEAR FROM ELECTIONS")} if 'ELECTIONS' in tables else set()
+    conn.close()
+    return years
+
+def carry_over_geometry(conn, live_file):
+    # Com --rebuild os dados são recriados do zero, mas a geometria da BD em uso
+    # passa para a nova, para que a troca não deixe o mapa vazio até correr built_geometry.py.
+    # Sem verificação de FK: DISTRICT_SHAPE usa códigos de ilhas (31-49) que não estão em DISTRICTS.
+    if not os.path.exists(live_file):
+        return
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("ATTACH DATABASE ? AS live", (live_file,))
+    live_tables = {r[0] for r in conn.execute("SELECT name FROM live.sqlite_master WHERE type = 'table'")}
+    for table in GEOMETRY_TABLES:
+        if table in live_tables:
+            conn.execute(f"INSERT OR IGNORE INTO {table} SELECT * FROM live.{table}")
+    conn.commit()
+    conn.execute("DETACH DATABASE live")
+
+def election_name(year):
+    return f"Autárquicas {year}"
+
+def upsert(conn, table, df):
+    # Dimensões partilhadas entre eleições: só insere os códigos ainda inexistentes
+    cols = ", ".join(df.columns)
+    marks = ", ".join("?" for _ in df.columns)
+    rows = df.astype(object).itertuples(index=False, name=None)
+    conn.executemany(f"INSERT OR IGNORE INTO {table} ({cols}) VALUES ({marks})", rows)
+
+def iter_votes_low_memory(df_res, parties, df_mandates, real_name_map, chunk_size, key='CONC_ID'):
+    # Gera a tabela VOTINGS por blocos de municípios, com siglas/nomes categóricos
+    # e inteiros reduzidos, para nunca ter o "melt" completo em memória.
+    # Com key='FREG_ID' gera os votos por freguesia (coluna MUNICIPALITY_CODE = código da freguesia).
+    party_type = pd.CategoricalDtype(parties)
+    if df_mandates is not None:
+        df_mandates = df_mandates.rename(columns={key: 'MUNICIPALITY_CODE'})
+        df_mandates['PARTY_ACRONYM'] = df_mandates['PARTY_ACRONYM'].astype(party_type)
+        df_mandates = df_mandates.dropna(subset=['PARTY_ACRONYM'])
+
+    for start in range(0, len(df_res), chunk_size):
+        chunk = df_res.iloc[start:start + chunk_size]
+        # As estatísticas já estão na mesma linha do município: entram como id_vars em vez de merge
+        df_votes = chunk.melt(id_vars=[key, 'INSC', 'BR', 'NUL'], value_vars=parties,
+                              var_name='PARTY_ACRONYM', value_name='VOTES')
+        df_votes.columns = ['MUNICIPALITY_CODE', 'TOTAL_VOTERS', 'BLANK_VOTES', 'NULL_VOTES',
+                            'PARTY_ACRONYM', 'VOTES']
+        df_votes['PARTY_ACRONYM'] = df_votes['PARTY_ACRONYM'].astype(party_type)
+        df_votes = resolve_detailed_names(df_votes, chunk, real_name_map)
+        df_votes['DETAILED_NAME'] = df_votes['DETAILED_NAME'].astype('category')
+
+        if df_mandates is not None:
+            df_votes = pd.merge(df_votes, df_mandates, on=['MUNICIPALITY_CODE', 'PARTY_ACRONYM'], how='left')
+            df_votes['MANDATES'] = df_votes['MANDATES'].fillna(0)
+        else:
+            df_votes['MANDATES'] = 0
+        df_votes = downcast_ints(df_votes, ['VOTES', 'MANDATES'])
+
+        yield df_votes[[
+            'MUNICIPALITY_CODE', 'PARTY_ACRONYM', 'DETAILED_NAME',
+            'VOTES', 'MANDATES', 'TOTAL_VOTERS', 'BLANK_VOTES', 'NULL_VOTES'
+        ]].copy()
+
+def load_parish_results(conn, year, results_file, mandates_file=None,
+                        low_memory=False, chunk_size=CHUNK_MUNICIPALITIES, memory_budget=None):
+    # Resultados das Assembleias de Freguesia (linhas 'AF', código de 6 dígitos)
+    # para PARISHES e PARISH_VOTINGS, na mesma transação da eleição.
+    df_res = read_excel_robust(results_file)
+    if df_res is None: return
+    df_res = clean_identifiers(df_res, organ='AF')
+    parties = detect_parties(df_res)
+
+    df_par = df_res[['FREG_ID', 'CONC_ID']].drop_duplicates(subset=['FREG_ID'])
+    df_par.columns = ['CODE', 'MUNICIPALITY_CODE']
+    if 'FREG' in df_res.columns:
+        df_par['NAME'] = df_res.loc[df_par.index, 'FREG'].str.title()
+    else:
+        # Sem nomes no ficheiro: ficam a NULL e o built_geometry.py preenche-os a partir da CAOP
+        print("⚠️  Coluna 'FREG' em falta: nomes das freguesias ficam por preencher (built_geometry.py)")
+        df_par['NAME'] = None
+    df_par = df_par[['CODE', 'NAME', 'MUNICIPALITY_CODE']]
+    upsert(conn, 'PARISHES', df_par)
+    upsert(conn, 'PARTIES', pd.DataFrame({'ACRONYM': parties, 'NAME': parties}))
+
+    for c in ['INSC', 'BR', 'NUL']:
+        if c not in df_res.columns: df_res[c] = 0
+
+    df_mandates = process_mandates_file(mandates_file, organ='AF', key='FREG_ID') if mandates_file else None
+
+    if low_memory:
+        real_name_map = build_real_name_map(df_res, key='FREG_ID')
+        df_res = downcast_ints(df_res[['FREG_ID', 'INSC', 'BR', 'NUL'] + parties].copy(),
+                               ['FREG_ID', 'INSC', 'BR', 'NUL'] + parties)
+        chunks = iter_votes_low_memory(df_res, parties, df_mandates, real_name_map, chunk_size, key='FREG_ID')
+    else:
+        chunks = [build_votes(df_res, parties, df_mandates, key='FREG_ID')]
+
+    for df_chunk in chunks:
+        df_chunk = df_chunk.rename(columns={'MUNICIPALITY_CODE': 'PARISH_CODE'})
+        df_chunk.insert(0, 'ELECTION_YEAR', year)
+        df_chunk.to_sql('PARISH_VOTINGS', conn, if_exists='append', index=False, chunksize=SQL_BATCH)
+        del df_chunk
+    report_memory("votos freguesias", memory_budget)
+
+def run_etl(year=DEFAULT_ELECTION_YEAR, results_file=EXCEL_FILE_RESULTS, mandates_file=EXCEL_FILE_MANDATES,
+            parish_results_file=None, parish_mandates_file=None,
+            replace=False, rebuild=False,
+            low_memory=False, chunk_size=CHUNK_MUNICIPALITIES, memory_budget=None):
+    # Carrega uma eleição (year) para a BD sem apagar as restantes (append-only).
+    # parish_results_file/parish_mandates_file: resultados das freguesias (opcional).
+    # replace: volta a carregar uma eleição já existente; rebuild: recria a BD do zero.
+    # low_memory: tipos categóricos/inteiros reduzidos, libertação de intermédios,
+    # processamento por blocos de municípios e escrita em lotes na BD.
+    # memory_budget: pico de RSS máximo (MB) tolerado no fim de cada etapa.
+    if not rebuild and is_legacy_database(DB_FILE):
+        # Migra antes de decidir se a eleição já existe, para que seats.py, compare.py,
+        # bulk_export.py e a GUI encontrem ELECTIONS/ELECTION_YEAR mesmo sem nova carga
+        migrate_database(DB_FILE)
+
+    if year in loaded_elections(DB_FILE) and not (replace or rebuild):
+        print(f"Eleição {year} já carregada (use --replace para a substituir).")
+        return
+
+    # 1. Leitura e Limpeza
+    df_res = read_excel_robust(results_file)
+    if df_res is None: return
+    df_res = clean_identifiers(df_res)
+    report_memory("leitura", memory_budget)
+    
+    parties = detect_parties(df_res)
 
     # 2. Tabelas Auxiliares
     df_dist = df_res[['DIST_ID', 'DIST']].drop_duplicates().sort_values('DIST_ID')
@@ -271,70 +523,121 @@ def run_etl():
     df_parties = pd.DataFrame(parties, columns=['ACRONYM'])
     df_parties['NAME'] = df_parties['ACRONYM']
 
-    # 3. Processar Votos
-    df_votes = df_res.melt(id_vars=['CONC_ID'], value_vars=parties, var_name='PARTY_ACRONYM', value_name='VOTES')
+    for c in ['INSC', 'BR', 'NUL']:
+        if c not in df_res.columns: df_res[c] = 0
+
+    if low_memory:
+        # Fica só com o necessário para os votos, com inteiros reduzidos
+        real_name_map = build_real_name_map(df_res)
+        df_res = downcast_ints(df_res[['CONC_ID', 'INSC', 'BR', 'NUL'] + parties].copy(),
+                               ['CONC_ID', 'INSC', 'BR', 'NUL'] + parties)
+        gc.collect()
+    report_memory("tabelas auxiliares", memory_budget)
+
+    # 3. Mandatos
+    df_mandates = process_mandates_file(mandates_file)
+    if df_mandates is not None and low_memory:
+        df_mandates = downcast_ints(df_mandates, ['CONC_ID', 'MANDATES'])
+    report_memory("mandatos", memory_budget)
+
+    # 4. Gravar na BD: numa cópia temporária, validada e trocada atomicamente no fim
+    # (ver snapshot.py), para que a GUI nunca veja a BD a meio da carga
+    with building_snapshot(DB_FILE, rebuild, required_tables=['ELECTIONS', 'VOTINGS']) as build_file:
+        print(f"--- A gravar eleição {year}: {build_file} ---")
+        conn = open_database(build_file)
+        try:
+            if replace:
+                conn.execute("DELETE FROM VOTINGS WHERE ELECTION_YEAR = ?", (year,))
+                conn.execute("DELETE FROM PARISH_VOTINGS WHERE ELECTION_YEAR = ?", (year,))
+
+            # Inserções
+            conn.execute("INSERT OR IGNORE INTO ELECTIONS (YEAR, NAME) VALUES (?, ?)", (year, election_name(year)))
+            upsert(conn, 'DISTRICTS', df_dist)
+            upsert(conn, 'MUNICIPALITIES', df_mun)
+            upsert(conn, 'PARTIES', df_parties)
+
+            if low_memory:
+                del df_dist, df_mun, df_parties
+                gc.collect()
+                for df_chunk in iter_votes_low_memory(df_res, parties, df_mandates, real_name_map, chunk_size):
+                    df_chunk.insert(0, 'ELECTION_YEAR', year)
+                    df_chunk.to_sql('VOTINGS', conn, if_exists='append', index=False, chunksize=SQL_BATCH)
+                    del df_chunk
+                del df_res, df_mandates
+                gc.collect()
+            else:
+                df_final = build_votes(df_res, parties, df_mandates)
+                df_final.insert(0, 'ELECTION_YEAR', year)
+                df_final.to_sql('VOTINGS', conn, if_exists='append', index=False)
+            report_memory("votos", memory_budget)
+
+            if parish_results_file:
+                load_parish_results(conn, year, parish_results_file, parish_mandates_file,
+                                    low_memory, chunk_size, memory_budget)
+
+            conn.commit()
+            if rebuild:
+                carry_over_geometry(conn, DB_FILE)
+        finally:
+            conn.close()
+
+    print("--- ETL Concluído! ---")
+
+def build_votes(df_res, parties, df_mandates, key='CONC_ID'):
+    # Processar Votos (modo normal: tudo em memória)
+    # Com key='FREG_ID' gera os votos por freguesia (coluna MUNICIPALITY_CODE = código da freguesia).
+    df_votes = df_res.melt(id_vars=[key], value_vars=parties, var_name='PARTY_ACRONYM', value_name='VOTES')
     df_votes['VOTES'] = pd.to_numeric(df_votes['VOTES'], errors='coerce').fillna(0).astype(int)
     df_votes.columns = ['MUNICIPALITY_CODE', 'PARTY_ACRONYM', 'VOTES'] 
 
     # Adicionar estatísticas à tabela de votos
-    for c in ['INSC', 'BR', 'NUL']:
-        if c not in df_res.columns: df_res[c] = 0
-    df_stats = df_res[['CONC_ID', 'INSC', 'BR', 'NUL']].drop_duplicates()
-    df_votes = pd.merge(df_votes, df_stats, left_on='MUNICIPALITY_CODE', right_on='CONC_ID', how='left')
-    df_votes = df_votes.drop(columns=['CONC_ID']) 
+    df_stats = df_res[[key, 'INSC', 'BR', 'NUL']].drop_duplicates()
+    df_votes = pd.merge(df_votes, df_stats, left_on='MUNICIPALITY_CODE', right_on=key, how='left')
+    df_votes = df_votes.drop(columns=[key]) 
     df_votes = df_votes.rename(columns={'INSC': 'TOTAL_VOTERS', 'BR': 'BLANK_VOTES', 'NUL': 'NULL_VOTES'})
     
     # Resolver nomes detalhados
-    df_votes = resolve_detailed_names(df_votes, df_res)
+    df_votes = resolve_detailed_names(df_votes, df_res, key=key)
 
-    # 4. Juntar Mandatos
-    df_mandates = process_mandates_file(EXCEL_FILE_MANDATES)
+    # Juntar Mandatos
     if df_mandates is not None:
         print("Juntando dados dos mandatos...")
-        df_mandates = df_mandates.rename(columns={'CONC_ID': 'MUNICIPALITY_CODE'})
+        df_mandates = df_mandates.rename(columns={key: 'MUNICIPALITY_CODE'})
         df_final = pd.merge(df_votes, df_mandates, on=['MUNICIPALITY_CODE', 'PARTY_ACRONYM'], how='left')
         df_final['MANDATES'] = df_final['MANDATES'].fillna(0).astype(int)
     else:
         df_final = df_votes
         df_final['MANDATES'] = 0
 
-    df_final = df_final[[
+    return df_final[[
         'MUNICIPALITY_CODE', 'PARTY_ACRONYM', 'DETAILED_NAME', 
         'VOTES', 'MANDATES', 'TOTAL_VOTERS', 'BLANK_VOTES', 'NULL_VOTES'
-    ]]
-
-    # 5. Gravar na BD
-    print(f"--- A gravar: {DB_FILE} ---")
-
-# Recriar base de dados
-    if os.path.exists(DB_FILE):
-        os.remove(DB_FILE)
-
-    if not os.path.exists(DDL_PATH):
-        raise FileNotFoundError(f"DDL não encontrado: {DDL_PATH}")
-
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-# Ativar FK
-    cursor.execute("PRAGMA foreign_keys = ON;")
-
-# Executar DDL externo
-    print(f"--- A executar DDL: {DDL_PATH} ---")
-    with open(DDL_PATH, "r", encoding="utf-8") as ddl_file:
-        ddl_sql = ddl_file.read()
-    cursor.executescript(ddl_sql)
-
-# Inserções
-    df_dist.to_sql('DISTRICTS', conn, if_exists='append', index=False)
-    df_mun.to_sql('MUNICIPALITIES', conn, if_exists='append', index=False)
-    df_parties.to_sql('PARTIES', conn, if_exists='append', index=False)
-    df_final.to_sql('VOTINGS', conn, if_exists='append', index=False)
-
-    conn.commit()
-    conn.close()
-
-    print("--- ETL Concluído! ---")
+    ]].copy()
 
 if __name__ == "__main__":
-    run_etl()
+    parser = argparse.ArgumentParser(description="ETL das Eleições Autárquicas para SQLite")
+    parser.add_argument("--year", type=int, default=DEFAULT_ELECTION_YEAR,
+                        help="ano da eleição a carregar")
+    parser.add_argument("--results", default=EXCEL_FILE_RESULTS,
+                        help="ficheiro Excel de resultados dessa eleição")
+    parser.add_argument("--mandates", default=EXCEL_FILE_MANDATES,
+                        help="ficheiro Excel de mandatos dessa eleição")
+    parser.add_argument("--parish-results", default=None,
+                        help="ficheiro Excel com os resultados das Assembleias de Freguesia (AF)")
+    parser.add_argument("--parish-mandates", default=None,
+                        help="ficheiro Excel de mandatos das Assembleias de Freguesia")
+    parser.add_argument("--replace", action="store_true",
+                        help="substitui a eleição se já estiver carregada")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="apaga a BD e recria-a antes de carregar")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="tipos categóricos, processamento por blocos e escrita em lotes")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_MUNICIPALITIES,
+                        help="nº de municípios por bloco no modo --low-memory")
+    parser.add_argument("--memory-budget", type=float, default=None,
+                        help="pico de RSS máximo em MB; aborta se for excedido")
+    args = parser.parse_args()
+    run_etl(year=args.year, results_file=args.results, mandates_file=args.mandates,
+            parish_results_file=args.parish_results, parish_mandates_file=args.parish_mandates,
+            replace=args.replace, rebuild=args.rebuild,
+            low_memory=args.low_memory, chunk_size=args.chunk_size, memory_budget=args.memory_budget)
@@ -0,0 +1,96 @@
+import sqlite3
+import os
+import argparse
+
+# --- CONFIGURAÇÃO ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, ".."))
+DB_FILE = os.path.join(PROJECT_ROOT, "db", "elections.db")
+
+# Vizinhos de um município, pela chave primária de MUNICIPALITY_ADJACENCY
+NEIGHBOURS_SQL = """
+    SELECT a.NEIGHBOUR_CODE, m.NAME, m.DISTRICT_CODE, a.BORDER_LENGTH
+    FROM MUNICIPALITY_ADJACENCY a
+    JOIN MUNICIPALITIES m ON m.CODE = a.NEIGHBOUR_CODE
+    WHERE a.MUNICIPALITY_CODE = ?
+    ORDER BY a.BORDER_LENGTH DESC
+"""
+
+# Diferença de percentagem de cada candidatura entre municípios vizinhos, numa eleição.
+# As candidaturas são comparadas pelo DETAILED_NAME: as siglas de coligações e grupos
+# de cidadãos ([A], [B], ...) são só a posição no boletim e mudam de lista em cada
+# município; as que ficaram por resolver no ETL são excluídas, tal como as candidaturas
+# sem votos (que não concorreram nesse município).
+# Cada par aparece uma vez (MUNICIPALITY_CODE < NEIGHBOUR_CODE); as percentagens usam
+# os totais de cada município, como em compare.py.
+SHARE_GAP_SQL = """
+    WITH totals AS (
+        SELECT MUNICIPALITY_CODE, SUM(VOTES) AS TOTAL
+        FROM VOTINGS
+        WHERE ELECTION_YEAR = :year
+        GROUP BY MUNICIPALITY_CODE
+    ),
+    shares AS (
+        SELECT v.MUNICIPALITY_CODE, v.DETAILED_NAME,
+               100.0 * SUM(v.VOTES) / NULLIF(t.TOTAL, 0) AS SHARE
+        FROM VOTINGS v
+        JOIN totals t ON t.MUNICIPALITY_CODE = v.MUNICIPALITY_CODE
+        WHERE v.ELECTION_YEAR = :year
+          AND v.DETAILED_NAME NOT LIKE '[%'
+          AND (:party IS NULL OR v.PARTY_ACRONYM = :party OR v.DETAILED_NAME = :party)
+        GROUP BY v.MUNICIPALITY_CODE, v.DETAILED_NAME
+        HAVING SUM(v.VOTES) > 0
+    )
+    SELECT ma.NAME, mb.NAME, sa.DETAILED_NAME,
+           ROUND(sa.SHARE, 2), ROUND(sb.SHARE, 2),
+           ROUND(sa.SHARE - sb.SHARE, 2) AS GAP, a.BORDER_LENGTH
+    FROM MUNICIPALITY_ADJACENCY a
+    JOIN shares sa ON sa.MUNICIPALITY_CODE = a.MUNICIPALITY_CODE
+    JOIN shares sb ON sb.MUNICIPALITY_CODE = a.NEIGHBOUR_CODE AND sb.DETAILED_NAME = sa.DETAILED_NAME
+    JOIN MUNICIPALITIES ma ON ma.CODE = a.MUNICIPALITY_CODE
+    JOIN MUNICIPALITIES mb ON mb.CODE = a.NEIGHBOUR_CODE
+    WHERE a.MUNICIPALITY_CODE < a.NEIGHBOUR_CODE
+    ORDER BY ABS(sa.SHARE - sb.SHARE) DESC
+"""
+
+
+def neighbours(conn, code):
+    # (código, nome, distrito, fronteira comum) dos vizinhos, da maior fronteira para a menor
+    return conn.execute(NEIGHBOURS_SQL, (code,)).fetchall()
+
+
+def share_gaps(conn, year, party=None):
+    # (município, vizinho, candidatura, % município, % vizinho, diferença p.p., fronteira comum),
+    # das maiores diferenças para as menores
+    return conn.execute(SHARE_GAP_SQL, {"year": year, "party": party}).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diferenças de resultados entre municípios vizinhos")
+    parser.add_argument("--year", type=int, default=None, help="eleição (por omissão, a mais recente)")
+    parser.add_argument("--party", help="sigla ou nome detalhado (p.ex. PS ou 'PPD/PSD.CDS-PP')")
+    parser.add_argument("--top", type=int, default=20, help="nº de linhas a mostrar")
+    args = parser.parse_args()
+
+    if not os.path.exists(DB_FILE):
+        raise FileNotFoundError("elections.db not found. Run etl.py first.")
+
+    conn = sqlite3.connect(DB_FILE)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ELECTIONS'").fetchone():
+        conn.close()
+        raise SystemExit("BD no formato antigo (sem ELECTIONS). Run etl.py first.")
+    year = args.year or conn.execute("SELECT MAX(YEAR) FROM ELECTIONS").fetchone()[0]
+    if conn.execute("SELECT COUNT(*) FROM MUNICIPALITY_ADJACENCY").fetchone()[0] == 0:
+        conn.close()
+        raise SystemExit("Sem vizinhanças na BD. Run built_geometry.py first.")
+
+    rows = share_gaps(conn, year, args.party)
+    conn.close()
+
+    print(f"{'Município':<24}{'Vizinho':<24}{'Candidatura':<24}{'%':>8}{'% viz.':>8}{'Δ p.p.':>9}{'Fronteira km':>14}")
+    for name, other, party, share, other_share, gap, border in rows[:args.top]:
+        print(f"{name:<24}{other:<24}{party[:23]:<24}{share:>8.2f}{other_share:>8.2f}{gap:>+9.2f}{border / 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import sqlite3
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# --- CONFIGURAÇÃO ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, ".."))
+DB_FILE = os.path.join(PROJECT_ROOT, "db", "elections.db")
+
+# Nº de simulações processadas de cada vez (limita a memória usada pelos quocientes)
+SIM_CHUNK = 500
+
+
+def latest_election(conn):
+    return conn.execute("SELECT MAX(YEAR) FROM ELECTIONS").fetchone()[0]
+
+
+def load_matrix(conn, year=None):
+    # Lê VOTINGS de uma eleição (por omissão a mais recente) para matrizes densas:
+    # uma linha por município, uma coluna por partido.
+    # O nº de mandatos de cada câmara é a soma dos MANDATES guardados.
+    if year is None:
+        year = latest_election(conn)
+    rows = conn.execute("""
+        SELECT MUNICIPALITY_CODE, PARTY_ACRONYM, VOTES, MANDATES
+        FROM VOTINGS
+        WHERE ELECTION_YEAR = ?
+        ORDER BY MUNICIPALITY_CODE, PARTY_ACRONYM
+    """, (year,)).fetchall()
+
+    codes = sorted({r[0] for r in rows})
+    parties = sorted({r[1] for r in rows})
+    row_idx = {c: i for i, c in enumerate(codes)}
+    col_idx = {p: j for j, p in enumerate(parties)}
+
+    votes = np.zeros((len(codes), len(parties)), dtype=np.int64)
+    mandates = np.zeros((len(codes), len(parties)), dtype=np.int64)
+    for mun, party, v, m in rows:
+        i, j = row_idx[mun], col_idx[party]
+        votes[i, j] = v or 0
+        mandates[i, j] = m or 0
+
+    seats = mandates.sum(axis=1)
+    return np.array(codes), parties, votes, seats, mandates
+
+
+def ranked_counts(v, quot, s):
+    # Mandatos por lista com ordenação completa dos quocientes.
+    # Empate no último mandato: ganha a lista com menos votos (Lei Orgânica 1/2001, art. 13.º).
+    # lexsort ordena pela última chave (quociente, descendente) e desempata pela primeira.
+    width = v.shape[-1]
+    tie = np.repeat(v, s, axis=-1)
+    order = np.lexsort((tie, -quot), axis=-1)[..., :s]
+    lists = order // s
+    return (lists[..., None] == np.arange(width)).sum(axis=-2)
+
+
+def dhondt(votes, seats, exact=True):
+    # Método de D'Hondt vetorizado para todos os municípios de uma vez.
+    #   votes: (..., M, P) votos por município e partido (pode ter eixos extra à esquerda,
+    #          p.ex. simulações); seats: (M,) mandatos a atribuir em cada município.
+    # Devolve um array inteiro (..., M, P) com os mandatos de cada partido.
+    # Os municípios são agrupados pelo nº de mandatos e pelo nº de listas com votos,
+    # para que cada grupo use uma matriz de quocientes retangular (listas x divisores)
+    # sem as dezenas de colunas de partidos que não concorreram nesse município.
+    # exact=False troca a ordenação completa por np.partition (modo das simulações);
+    # só os municípios com quocientes empatados no último mandato (p.ex. noise=0 ou
+    # só swing) voltam à ordenação completa, com o desempate legal.
+    votes = np.asarray(votes)
+    seats = np.asarray(seats)
+    ftype = np.result_type(votes.dtype, np.float32)
+    out = np.zeros(votes.shape, dtype=np.int64)
+
+    active = votes > 0
+    if active.ndim > 2:
+        active = active.reshape((-1,) + active.shape[-2:]).any(axis=0)
+    n_active = active.sum(axis=1)
+    # Listas ativas primeiro, mantendo a ordem original das colunas
+    ranked = np.argsort(~active, axis=1, kind="stable")
+
+    for s, width in set(zip(seats.tolist(), n_active.tolist())):
+        if s <= 0 or width == 0:
+            continue
+        sel = np.nonzero((seats == s) & (n_active == width))[0]
+        cols = ranked[sel, :width]
+        idx = np.broadcast_to(cols, votes.shape[:-2] + cols.shape)
+        v = np.take_along_axis(votes[..., sel, :], idx, axis=-1).astype(ftype)
+
+        # Quocientes v/1, v/2, ..., v/s achatados por lista: índice = lista*s + divisor
+        divisors = np.arange(1, s + 1, dtype=ftype)
+        quot = (v[..., None] / divisors).reshape(v.shape[:-1] + (width * s,))
+
+        if exact:
+            counts = ranked_counts(v, quot, s)
+        elif width * s == s:
+            # Uma única lista com votos leva todos os mandatos
+            counts = np.full(v.shape, s, dtype=np.int64)
+        else:
+            # O s-ésimo maior quociente é o limiar; cada lista ganha tantos mandatos
+            # quantos os seus quocientes iguais ou acima dele.
+            k = quot.shape[-1] - s
+            threshold = np.partition(quot, k, axis=-1)[..., k]
+            won = quot >= threshold[..., None]
+            counts = won.reshape(v.shape + (s,)).sum(axis=-1)
+            # Com empates no limiar haveria mais do que s mandatos: esses casos são refeitos
+            overflow = won.sum(axis=-1) > s
+            if overflow.any():
+                counts[overflow] = ranked_counts(v[overflow], quot[overflow], s)
+
+        res = np.zeros(v.shape[:-1] + (votes.shape[-1],), dtype=np.int64)
+        np.put_along_axis(res, idx, counts, axis=-1)
+        out[..., sel, :] = res
+
+    return out
+
+
+def validate_mandates(conn, year=None):
+    # Recalcula os mandatos a partir dos votos e compara com VOTINGS.MANDATES.
+    # Devolve a lista de (município, partido, guardado, calculado) que não coincidem.
+    codes, parties, votes, seats, mandates = load_matrix(conn, year)
+    computed = dhondt(votes, seats)
+
+    diffs = []
+    for i, j in zip(*np.nonzero(computed != mandates)):
+        diffs.append((int(codes[i]), parties[j], int(mandates[i, j]), int(computed[i, j])))
+    return diffs
+
+
+def apply_swing(votes, parties, swing):
+    # Cenário "what-if": swing é um dicionário {sigla: fator multiplicativo},
+    # p.ex. {'PS': 0.95, 'CH': 1.10} tira 5% ao PS e dá mais 10% ao CH em todo o país.
+    factors = np.ones(len(parties), dtype=np.float64)
+    for acronym, factor in (swing or {}).items():
+        if acronym not in parties:
+            raise ValueError(f"Partido desconhecido: {acronym}")
+        factors[parties.index(acronym)] = factor
+    return votes * factors
+
+
+def simulate(votes, seats, draws=100_000, noise=0.02, swing=None, parties=None,
+             seed=None, chunk=SIM_CHUNK, workers=None):
+    # Simulação Monte Carlo: aplica o swing (opcional) e um ruído multiplicativo
+    # log-normal de desvio 'noise' a cada votação, e recalcula D'Hondt em cada sorteio.
+    # Devolve dist (M, P, S_max+1): nº de sorteios em que o partido P obteve k mandatos
+    # no município M. Dividir por 'draws' dá a probabilidade.
+    if swing:
+        if parties is None:
+            raise ValueError("'parties' é necessário para aplicar um swing")
+        base = apply_swing(votes, parties, swing).astype(np.float32)
+    else:
+        base = np.asarray(votes, dtype=np.float32)
+
+    n_mun, n_parties = base.shape
+    max_seats = int(np.max(seats))
+    dist = np.zeros((n_mun, n_parties, max_seats + 1), dtype=np.int64)
+    # Só as células com votos são sorteadas e contabilizadas (~1/5 da matriz)
+    active = base > 0
+    base_active = base[active]
+    # Índices para acumular os histogramas com um único bincount por bloco
+    cell = np.flatnonzero(active) * (max_seats + 1)
+
+    def run_chunk(n, chunk_rng):
+        sample = np.zeros((n, n_mun, n_parties), dtype=np.float32)
+        if noise:
+            shocks = chunk_rng.standard_normal((n, base_active.size), dtype=np.float32)
+            sample[:, active] = base_active * np.exp(shocks * np.float32(noise))
+        else:
+            sample[:, active] = base_active
+        result = dhondt(sample, seats, exact=False)[:, active]
+        return np.bincount((cell + result).ravel(), minlength=dist.size)
+
+    # Blocos independentes, cada um com o seu gerador, repartidos por threads
+    # (o NumPy liberta o GIL nas operações sobre arrays grandes)
+    sizes = [min(chunk, draws - start) for start in range(0, draws, chunk)]
+    rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(len(sizes))]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for counts in pool.map(run_chunk, sizes, rngs):
+            dist += counts.reshape(dist.shape)
+
+    return dist
+
+
+def expected_seats(dist):
+    # Média de mandatos por município e partido a partir da distribuição simulada
+    k = np.arange(dist.shape[-1])
+    return (dist * k).sum(axis=-1) / dist.sum(axis=-1).clip(min=1)
+
+
+def check_ties():
+    # Regressão: quocientes empatados no último mandato (60/2 = 30/1, 465/3 = 155/1)
+    # não podem dar mandatos a mais no modo das simulações; ganha a lista com menos votos
+    votes = np.array([[60, 30, 0], [465, 155, 0]])
+    seats = np.array([2, 3])
+    expected = np.array([[1, 1, 0], [2, 1, 0]])
+    for exact in (True, False):
+        got = dhondt(votes, seats, exact=exact)
+        if not (got == expected).all():
+            raise AssertionError(f"D'Hondt (exact={exact}) com empates: {got.tolist()} != {expected.tolist()}")
+    sim = expected_seats(simulate(votes, seats, draws=10, noise=0))
+    if not np.allclose(sim, expected):
+        raise AssertionError(f"Simulação sem ruído com empates: {sim.tolist()}")
+    print("✅ D'Hondt com empates: modo exato, modo das simulações e simulação sem ruído ✅")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mandatos por D'Hondt e simulação Monte Carlo")
+    parser.add_argument("--self-test", action="store_true",
+                        help="só verifica o D'Hondt com empates (sem BD) e sai")
+    args = parser.parse_args()
+
+    if args.self_test:
+        check_ties()
+        return
+
+    if not os.path.exists(DB_FILE):
+        raise FileNotFoundError("elections.db not found. Run etl.py first.")
+
+    conn = sqlite3.connect(DB_FILE)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ELECTIONS'").fetchone():
+        conn.close()
+        raise SystemExit("BD no formato antigo (sem ELECTIONS). Run etl.py first.")
+    codes, parties, votes, seats, mandates = load_matrix(conn)
+
+    t0 = time.perf_counter()
+    diffs = validate_mandates(conn)
+    conn.close()
+    print(f"D'Hondt: {len(codes)} municípios em {time.perf_counter() - t0:.3f}s")
+    if diffs:
+        print(f"⚠️  {len(diffs)} diferenças face a VOTINGS.MANDATES:")
+        for mun, party, stored, calc in diffs[:20]:
+            print(f"   {mun} {party}: guardado={stored} calculado={calc}")
+    else:
+        print("✅ Mandatos calculados coincidem com VOTINGS.MANDATES ✅")
+
+    draws = 100_000
+    t0 = time.perf_counter()
+    dist = simulate(votes, seats, draws=draws, seed=0)
+    elapsed = time.perf_counter() - t0
+    print(f"Simulação: {draws} sorteios em {elapsed:.2f}s")
+
+    totals = expected_seats(dist).sum(axis=0)
+    for j in np.argsort(-totals)[:8]:
+        print(f"   {parties[j]:<12} {totals[j]:8.1f} mandatos esperados "
+              f"(eleitos: {mandates[:, j].sum()})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import sqlite3
+import os
+import time
+from contextlib import contextmanager
+
+# A BD em uso (db/elections.db) nunca é escrita no lugar: cada construção (ETL ou
+# geometria) trabalha numa cópia temporária na mesma pasta, que é validada,
+# carimbada com uma nova versão (PRAGMA user_version) e trocada atomicamente
+# com os.replace. Os leitores (GUI) veem a BD antiga ou a nova, nunca uma a meio.
+# Só uma construção de cada vez: um ficheiro de lock criado com O_EXCL impede que o ETL
+# e o built_geometry.py partam ambos da versão N e o último a publicar apague o outro.
+
+# Tabelas cujas chaves estrangeiras têm de estar íntegras antes da troca
+# (as *_SHAPE usam códigos de ilhas 31-49 que não existem em DISTRICTS)
+FK_CHECKED_TABLES = ["MUNICIPALITIES", "VOTINGS", "PARISHES", "PARISH_VOTINGS"]
+
+# No Windows os.replace falha enquanto um leitor tem o ficheiro aberto
+SWAP_RETRIES = 20
+SWAP_RETRY_DELAY = 0.25
+
+
+def db_version(db_file):
+    if not os.path.exists(db_file):
+        return 0
+    conn = sqlite3.connect(db_file)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.close()
+    return version
+
+
+def copy_database(src_file, dst_file):
+    # Cópia consistente mesmo com leitores ativos (API de backup do SQLite)
+    src = sqlite3.connect(src_file)
+    dst = sqlite3.connect(dst_file)
+    src.backup(dst)
+    dst.close()
+    src.close()
+
+
+def validate_snapshot(db_file, required_tables=()):
+    # Falha (ValueError) se a cópia estiver corrompida, tiver chaves estrangeiras
+    # órfãs nas tabelas de dados, ou alguma tabela obrigatória estiver vazia
+    conn = sqlite3.connect(db_file)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise ValueError(f"integrity_check falhou: {result}")
+
+        existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in FK_CHECKED_TABLES:
+            if table in existing:
+                orphans = conn.execute(f"PRAGMA foreign_key_check({table})").fetchall()
+                if orphans:
+                    raise ValueError(f"{len(orphans)} chaves estrangeiras inválidas em {table}")
+
+        for table in required_tables:
+            if table not in existing:
+                raise ValueError(f"Tabela em falta: {table}")
+            if conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0:
+                raise ValueError(f"Tabela vazia: {table}")
+    finally:
+        conn.close()
+
+
+def acquire_lock(db_file):
+    lock_file = f"{db_file}.lock"
+    try:
+        fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        raise RuntimeError(
+            f"Outra construção da BD está a decorrer ({lock_file}). "
+            "Se nenhuma estiver a correr (p.ex. após uma falha), apague o ficheiro."
+        ) from None
+    os.write(fd, str(os.getpid()).encode())
+    os.close(fd)
+    return lock_file
+
+
+def swap_into_place(tmp_file, db_file):
+    for attempt in range(SWAP_RETRIES):
+        try:
+            os.replace(tmp_file, db_file)
+            return
+        except PermissionError:
+            if attempt == SWAP_RETRIES - 1:
+                raise
+            time.sleep(SWAP_RETRY_DELAY)
+
+
+@contextmanager
+def building_snapshot(db_file, rebuild=False, required_tables=()):
+    # Uso:
+    #     with building_snapshot(DB_FILE, required_tables=["VOTINGS"]) as build_file:
+    #         ... escrever em build_file ...
+    # Sem rebuild, a construção parte de uma cópia da BD atual. Se o bloco falhar
+    # ou a validação não passar, a cópia é apagada e a BD em uso fica intacta.
+    lock_file = acquire_lock(db_file)
+    tmp_file = f"{db_file}.{os.getpid()}.building"
+
+    try:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+        previous = db_version(db_file)
+        if not rebuild and os.path.exists(db_file):
+            copy_database(db_file, tmp_file)
+
+        yield tmp_file
+        validate_snapshot(tmp_file, required_tables)
+
+        # Salvaguarda para quem publique sem passar pelo lock: nunca esmagar uma versão mais nova
+        current = db_version(db_file)
+        if current != previous:
+            raise RuntimeError(f"A BD mudou durante a construção (v{previous} -> v{current}); nada foi publicado")
+
+        conn = sqlite3.connect(tmp_file)
+        conn.execute(f"PRAGMA user_version = {previous + 1}")
+        conn.commit()
+        conn.close()
+
+        swap_into_place(tmp_file, db_file)
+        print(f"--- Snapshot v{previous + 1} publicada: {db_file} ---")
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        os.remove(lock_file)